@@ -1,35 +1,118 @@
 from __future__ import annotations
 
-from datetime import timedelta
+import contextvars
+import importlib
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
 
-from .const import DATA_COORDINATOR, DOMAIN
+from .const import (
+    CONF_DELIVERY_SITE_ID,
+    DATA_ACCOUNTS,
+    DATA_COORDINATOR,
+    DATA_SCHEDULE,
+    DOMAIN,
+    RESOLUTION_QUARTER,
+)
 
-PLATFORMS: list[Platform] = [Platform.SENSOR]
+PLATFORMS: list[Platform] = [Platform.BINARY_SENSOR, Platform.SENSOR]
+
+# Loaded in the import executor before first use, so setup does not block the
+# event loop on module imports. helenservice is only imported by the login,
+# which already runs in the executor.
+_RUNTIME_MODULES = (f"{__name__}.coordinator", f"{__name__}.services")
+
+
+def _import_runtime_modules() -> None:
+    for module in _RUNTIME_MODULES:
+        importlib.import_module(module)
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    from .coordinator import OmaHelenCoordinator
+    await hass.async_add_import_executor_job(_import_runtime_modules)
+
+    from .coordinator import OmaHelenAccountCoordinator, OmaHelenCoordinator, account_key
+    from .scheduler import PublicationSchedule
     from .services import async_setup_services
 
-    coordinator = OmaHelenCoordinator(hass, entry, update_interval=timedelta(hours=6))
-    await coordinator.async_config_entry_first_refresh()
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    schedule: PublicationSchedule | None = domain_data.get(DATA_SCHEDULE)
+    if schedule is None:
+        schedule = domain_data[DATA_SCHEDULE] = PublicationSchedule(hass)
+    await schedule.async_load()
 
-    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {DATA_COORDINATOR: coordinator}
+    # Delivery sites of the same account share one client and one poll timer.
+    accounts: dict[str, OmaHelenAccountCoordinator] = domain_data.setdefault(DATA_ACCOUNTS, {})
+    key = account_key(entry)
+    account = accounts.get(key)
+    if account is None:
+        # Build it outside this entry's context so it is not tied to (and shut
+        # down with) whichever site of the account happened to load first.
+        account = accounts[key] = contextvars.Context().run(
+            OmaHelenAccountCoordinator, hass, key, schedule, entry.title
+        )
+        await account.async_register_shutdown()
+
+    coordinator = OmaHelenCoordinator(hass, entry, account)
+    account.add_site(coordinator)
+    try:
+        await coordinator.async_load_state()
+    except Exception:
+        await _async_release_site(hass, coordinator)
+        raise
+    # Start from what the last run stored and fetch in the background, so a
+    # login check or a pending backfill does not hold up Home Assistant's boot.
+    # Failures surface as unavailable entities and are retried on the account's
+    # poll schedule.
+    coordinator.async_set_updated_data(coordinator.restored_data())
+
+    hass.data[DOMAIN][entry.entry_id] = {DATA_COORDINATOR: coordinator}
+    entry.async_on_unload(account.async_add_listener(coordinator.async_handle_account_update))
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     await async_setup_services(hass)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+    entry.async_create_background_task(
+        hass, coordinator.async_refresh(), f"{DOMAIN} first refresh {entry.entry_id}"
+    )
     return True
 
 
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    # Reauth and the progress migration also update the entry; only option
+    # changes need a reload.
+    coordinator = hass.data[DOMAIN][entry.entry_id][DATA_COORDINATOR]
+    if dict(entry.options) != coordinator.options:
+        await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     from .services import async_unload_services
 
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id, None)
+        entry_data = hass.data[DOMAIN].pop(entry.entry_id, None)
+        if entry_data is not None:
+            await _async_release_site(hass, entry_data[DATA_COORDINATOR])
         await async_unload_services(hass)
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    from .cache import OmaHelenResponseCache
+    from .state import OmaHelenImportStateStore
+
+    await OmaHelenResponseCache(
+        hass, str(entry.data[CONF_DELIVERY_SITE_ID]), RESOLUTION_QUARTER
+    ).async_remove()
+    await OmaHelenImportStateStore(hass, entry).async_remove()
+
+
+async def _async_release_site(hass: HomeAssistant, coordinator) -> None:
+    await coordinator.async_flush()
+    account = coordinator.account
+    account.remove_site(coordinator)
+    if not account.sites:
+        hass.data[DOMAIN][DATA_ACCOUNTS].pop(account.key, None)
+        await account.async_shutdown()
@@ -1,12 +1,30 @@
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
-from datetime import date
-from typing import TYPE_CHECKING
+from datetime import date, datetime, timezone
+from email.utils import parsedate_to_datetime
+import json
+import re
+from typing import Any
 
-if TYPE_CHECKING:
-    from helenservice.api_client import HelenApiClient
-    from helenservice.api_response import MeasurementsWithSpotPriceResponse
+import aiohttp
+import jwt
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .timeutil import local_day_range
+
+HELEN_API_URL = "https://api.omahelen.fi/v25"
+CONTRACT_ENDPOINT = "/contract/list"
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
+_CONTRACT_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Statuses worth retrying: timeouts, rate limiting and server-side failures.
+_TRANSIENT_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
 
 
 class OmaHelenAuthError(Exception):
@@ -17,21 +35,115 @@ class OmaHelenDeliverySiteError(Exception):
     pass
 
 
+class OmaHelenApiError(Exception):
+    def __init__(
+        self, message: str, *, transient: bool = False, retry_after: float | None = None
+    ) -> None:
+        super().__init__(message)
+        # Transient errors may succeed when retried; retry_after is the delay in
+        # seconds the server asked for, if any.
+        self.transient = transient
+        self.retry_after = retry_after
+
+
 @dataclass(frozen=True, slots=True)
 class OmaHelenLoginResult:
     access_token: str
     delivery_site_ids: list[str]
 
 
-class _TokenSession:
-    def __init__(self, access_token: str) -> None:
+class OmaHelenApiClient:
+    def __init__(self, session: aiohttp.ClientSession, access_token: str) -> None:
+        self._session = session
         self._access_token = access_token
+        self._contracts: dict[str, dict[str, Any]] = {}
 
-    def get_access_token(self) -> str:
-        return self._access_token
+    def set_access_token(self, access_token: str) -> None:
+        # Contracts belong to the account, so a renewed token keeps them.
+        self._access_token = access_token
 
-    def close(self) -> None:
-        return None
+    def has_delivery_site(self, delivery_site_id: str) -> bool:
+        return delivery_site_id in self._contracts
+
+    def gsrn(self, delivery_site_id: str) -> str:
+        contract = self._contracts.get(delivery_site_id)
+        if contract is None:
+            raise OmaHelenDeliverySiteError(f"No active contract for delivery site {delivery_site_id}")
+        return str(contract["gsrn"])
+
+    async def async_get_active_contracts(self) -> list[dict[str, Any]]:
+        payload = await self._async_get_json(
+            f"{HELEN_API_URL}{CONTRACT_ENDPOINT}",
+            {"include_transfer": "true", "update": "true", "include_products": "true"},
+        )
+        now = datetime.now()
+        return [contract for contract in payload["contracts"] if _is_active_contract(contract, now)]
+
+    async def async_select_delivery_sites(self, delivery_site_ids: Iterable[str]) -> None:
+        # One contract listing resolves every delivery site of the account.
+        contracts = await self.async_get_active_contracts()
+        for delivery_site_id in delivery_site_ids:
+            matches = [
+                contract
+                for contract in contracts
+                if delivery_site_id
+                in (str(contract["delivery_site"]["id"]), str(contract["gsrn"]))
+            ]
+            if not matches:
+                self._contracts.pop(delivery_site_id, None)
+                continue
+            self._contracts[delivery_site_id] = max(
+                matches,
+                key=lambda contract: datetime.strptime(contract["start_date"], _CONTRACT_TIME_FORMAT),
+            )
+
+    async def async_get_measurements_with_spot_prices(
+        self, delivery_site_id: str, start: date, end: date, resolution: str
+    ) -> str:
+        start_time, end_time = _utc_time_range(start, end)
+        return await self._async_get_chart_data(delivery_site_id, start_time, end_time, resolution)
+
+    async def async_get_measurements_between(
+        self, delivery_site_id: str, start: datetime, end: datetime, resolution: str
+    ) -> str:
+        return await self._async_get_chart_data(
+            delivery_site_id,
+            start.astimezone(timezone.utc).isoformat(),
+            end.astimezone(timezone.utc).isoformat(),
+            resolution,
+        )
+
+    async def _async_get_chart_data(
+        self, delivery_site_id: str, start_time: str, end_time: str, resolution: str
+    ) -> str:
+        return await self._async_get_text(
+            f"{HELEN_API_URL}/chart-data/{self.gsrn(delivery_site_id)}/electricity",
+            {"start": start_time, "stop": end_time, "resolution": resolution, "channel": "oh"},
+        )
+
+    async def _async_get_json(self, url: str, params: dict[str, str]) -> Any:
+        return json.loads(await self._async_get_text(url, params))
+
+    async def _async_get_text(self, url: str, params: dict[str, str]) -> str:
+        headers = {
+            "Authorization": f"Bearer {self._access_token}",
+            "Accept": "application/json",
+        }
+        try:
+            async with self._session.get(
+                url, params=params, headers=headers, timeout=HTTP_TIMEOUT
+            ) as resp:
+                if resp.status in (401, 403):
+                    raise OmaHelenAuthError(f"Helen API rejected the access token ({resp.status})")
+                if resp.status >= 400:
+                    raise OmaHelenApiError(
+                        f"Helen API returned {resp.status} for {url}",
+                        transient=resp.status in _TRANSIENT_STATUSES,
+                        retry_after=_parse_retry_after(resp.headers.get("Retry-After")),
+                    )
+                return await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            raise OmaHelenApiError(f"Request to {url} failed", transient=True) from exc
 
 
 def login(username: str, password: str) -> OmaHelenLoginResult:
@@ -47,28 +159,157 @@ def login(username: str, password: str) -> OmaHelenLoginResult:
         raise OmaHelenAuthError from exc
 
 
-def build_client(access_token: str, delivery_site_id: str | None) -> HelenApiClient:
-    from helenservice.api_client import HelenApiClient
-    from helenservice.api_exceptions import InvalidDeliverySiteException
+async def async_login(hass: HomeAssistant, username: str, password: str) -> OmaHelenLoginResult:
+    # The login is a multi-step HTML form flow implemented by helenservice; it only
+    # runs from the config flow, so it stays on the executor.
+    return await hass.async_add_executor_job(login, username, password)
 
-    client = HelenApiClient()
-    client._session = _TokenSession(access_token)  # type: ignore[attr-defined]
-    client._latest_login_time = None  # type: ignore[attr-defined]
-    client._refresh_api_client_state()  # type: ignore[attr-defined]
 
-    if delivery_site_id:
-        try:
-            client.select_delivery_site_if_valid_id(delivery_site_id)
-        except InvalidDeliverySiteException as exc:
-            raise OmaHelenDeliverySiteError from exc
+def token_expiry(access_token: str) -> datetime | None:
+    # Only the expiry is read, to renew the token in time; Helen verifies it.
+    try:
+        claims = jwt.decode(access_token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return None
+    exp = claims.get("exp")
+    if not isinstance(exp, (int, float)):
+        return None
+    return datetime.fromtimestamp(exp, timezone.utc)
 
+
+async def async_build_client(
+    hass: HomeAssistant, access_token: str, delivery_site_ids: Iterable[str]
+) -> OmaHelenApiClient:
+    client = OmaHelenApiClient(async_get_clientsession(hass), access_token)
+    await client.async_select_delivery_sites(delivery_site_ids)
     return client
 
 
-def get_measurements_with_spot_prices(
-    client: HelenApiClient,
+async def async_get_measurements_with_spot_prices(
+    client: OmaHelenApiClient,
+    delivery_site_id: str,
     start: date,
     end: date,
     resolution: str,
-) -> MeasurementsWithSpotPriceResponse:
-    return client.get_measurements_with_spot_prices(start, end, resolution)
+) -> str:
+    return await client.async_get_measurements_with_spot_prices(
+        delivery_site_id, start, end, resolution
+    )
+
+
+async def async_get_measurements_between(
+    client: OmaHelenApiClient,
+    delivery_site_id: str,
+    start: datetime,
+    end: datetime,
+    resolution: str,
+) -> str:
+    return await client.async_get_measurements_between(delivery_site_id, start, end, resolution)
+
+
+def iter_series(body: str) -> Iterator[dict[str, Any]]:
+    # Walk the top-level object by hand and decode "series" entries one at a time,
+    # so the full list of entries is never materialized.
+    try:
+        yield from _iter_series(body)
+    except (KeyError, ValueError) as exc:
+        raise OmaHelenApiError(f"Malformed measurements payload: {exc}") from exc
+
+
+def _iter_series(body: str) -> Iterator[dict[str, Any]]:
+    decoder = json.JSONDecoder()
+    idx = _expect(body, 0, "{")
+    while body[idx : idx + 1] != "}":
+        key, idx = decoder.raw_decode(body, idx)
+        idx = _expect(body, _skip_whitespace(body, idx), ":")
+        if key == "series" and body[idx : idx + 1] == "[":
+            idx = _skip_whitespace(body, idx + 1)
+            while body[idx : idx + 1] != "]":
+                entry, idx = decoder.raw_decode(body, idx)
+                if not isinstance(entry, dict):
+                    raise OmaHelenApiError(f"Unexpected series entry at offset {idx}")
+                yield entry
+                idx = _skip_separator(body, idx, "]")
+            idx += 1
+        else:
+            _, idx = decoder.raw_decode(body, idx)
+        idx = _skip_separator(body, idx, "}")
+
+
+def parse_timestamp(value: str) -> datetime:
+    ts = value.rstrip()
+    if ts.endswith("Z"):
+        ts = f"{ts[:-1]}+00:00"
+    parsed = datetime.fromisoformat(ts)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def spot_price(entry: dict[str, Any]) -> tuple[float, bool] | None:
+    # The spot price and whether it includes VAT. Helen normally sends it with
+    # VAT, but some entries only carry the price without.
+    spot = entry.get("electricity_spot_prices_vat")
+    if spot is not None:
+        return float(spot), True
+    spot = entry.get("electricity_spot_prices")
+    return None if spot is None else (float(spot), False)
+
+
+def _skip_whitespace(body: str, idx: int) -> int:
+    return _WHITESPACE.match(body, idx).end()
+
+
+def _skip_separator(body: str, idx: int, closing: str) -> int:
+    # Past the comma to the next value, or onto the closing bracket; anything
+    # else (a missing comma, a trailing comma, a truncated body) is malformed.
+    idx = _skip_whitespace(body, idx)
+    token = body[idx : idx + 1]
+    if token == ",":
+        idx = _skip_whitespace(body, idx + 1)
+        if body[idx : idx + 1] not in ("", closing):
+            return idx
+    elif token == closing:
+        return idx
+    raise OmaHelenApiError(f"Unexpected measurements payload at offset {idx}")
+
+
+def _expect(body: str, idx: int, token: str) -> int:
+    idx = _skip_whitespace(body, idx)
+    if body[idx : idx + 1] != token:
+        raise OmaHelenApiError(f"Unexpected measurements payload at offset {idx}")
+    return _skip_whitespace(body, idx + 1)
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    # Either a number of seconds or an HTTP date.
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _is_active_contract(contract: dict[str, Any], now: datetime) -> bool:
+    if datetime.strptime(contract["start_date"], _CONTRACT_TIME_FORMAT) > now:
+        return False
+    end_date = contract.get("end_date")
+    if end_date is not None and datetime.strptime(end_date, _CONTRACT_TIME_FORMAT) < now:
+        return False
+    return contract.get("domain") != "electricity-production"
+
+
+def _utc_time_range(start: date, end: date) -> tuple[str, str]:
+    local_start, local_end = local_day_range(start, end)
+    return (
+        local_start.astimezone(timezone.utc).isoformat(),
+        local_end.astimezone(timezone.utc).isoformat(),
+    )
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
+import math
+from typing import Any
+
+from .const import BASELINE_MIN_SAMPLES, BASELINE_WINDOW_WEEKS, INTERVAL_SECONDS
+from .timeutil import HELEN_TIME_ZONE
+
+_SLOTS_PER_DAY = 24 * 3600 // INTERVAL_SECONDS
+_SLOTS = 7 * _SLOTS_PER_DAY
+# Noise floor for the spread of a check, so flat loads with almost no variance do
+# not turn every small wobble into an anomaly.
+_MIN_STD_KWH = 0.1
+_MIN_RELATIVE_STD = 0.1
+
+
+@dataclass(frozen=True, slots=True)
+class ConsumptionCheck:
+    # Actual against expected consumption over the most recently imported
+    # quarter-hours that have a baseline.
+    start: float
+    end: float
+    actual_kwh: float
+    expected_kwh: float
+    std_kwh: float
+
+    @property
+    def z_score(self) -> float:
+        return (self.actual_kwh - self.expected_kwh) / self.std_kwh
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "start": self.start,
+            "end": self.end,
+            "actual_kwh": self.actual_kwh,
+            "expected_kwh": self.expected_kwh,
+            "std_kwh": self.std_kwh,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, float] | None) -> ConsumptionCheck | None:
+        return None if data is None else cls(**data)
+
+
+class ConsumptionBaseline:
+    """Mean and variance of quarter-hour consumption per weekday and time of day.
+
+    Each slot is updated incrementally (Welford/West), with the sample weight
+    floored at one in BASELINE_WINDOW_WEEKS so old weeks fade out and the
+    baseline follows changes in the household.
+    """
+
+    __slots__ = ("counts", "means", "variances")
+
+    def __init__(
+        self,
+        counts: array | None = None,
+        means: array | None = None,
+        variances: array | None = None,
+    ) -> None:
+        self.counts = counts if counts is not None else array("d", bytes(8 * _SLOTS))
+        self.means = means if means is not None else array("d", bytes(8 * _SLOTS))
+        self.variances = variances if variances is not None else array("d", bytes(8 * _SLOTS))
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any] | None) -> ConsumptionBaseline:
+        if not data:
+            return cls()
+        return cls(array("d", data["n"]), array("d", data["mean"]), array("d", data["var"]))
+
+    def as_dict(self) -> dict[str, list[float]]:
+        return {"n": self.counts.tolist(), "mean": self.means.tolist(), "var": self.variances.tolist()}
+
+    @property
+    def ready_slots(self) -> int:
+        return sum(count >= BASELINE_MIN_SAMPLES for count in self.counts)
+
+    @staticmethod
+    def slots(starts: Sequence[float]) -> array:
+        # Local wall-clock slot of each interval start, Monday 00:00 being 0.
+        slots = array("H")
+        for start in starts:
+            local = datetime.fromtimestamp(start, HELEN_TIME_ZONE)
+            slots.append(
+                local.weekday() * _SLOTS_PER_DAY
+                + (local.hour * 3600 + local.minute * 60) // INTERVAL_SECONDS
+            )
+        return slots
+
+    def expected(self, slots: Sequence[int]) -> array:
+        # NaN where the slot has too few samples to predict anything yet.
+        counts, means = self.counts, self.means
+        return array(
+            "d",
+            (means[slot] if counts[slot] >= BASELINE_MIN_SAMPLES else math.nan for slot in slots),
+        )
+
+    def check(
+        self, slots: Sequence[int], starts: Sequence[float], values: Sequence[float]
+    ) -> ConsumptionCheck | None:
+        counts, means, variances = self.counts, self.means, self.variances
+        actual = expected = variance = 0.0
+        first = last = None
+        for slot, start, value in zip(slots, starts, values):
+            if math.isnan(value) or counts[slot] < BASELINE_MIN_SAMPLES:
+                continue
+            actual += value
+            expected += means[slot]
+            # Quarter-hours are treated as independent, so variances add up.
+            variance += variances[slot]
+            if first is None:
+                first = start
+            last = start
+        if first is None:
+            return None
+        std = max(math.sqrt(variance), _MIN_STD_KWH, _MIN_RELATIVE_STD * expected)
+        return ConsumptionCheck(first, last + INTERVAL_SECONDS, actual, expected, std)
+
+    def update(self, slots: Sequence[int], values: Sequence[float]) -> None:
+        counts, means, variances = self.counts, self.means, self.variances
+        for slot, value in zip(slots, values):
+            if math.isnan(value):
+                continue
+            count = counts[slot] = counts[slot] + 1
+            weight = 1.0 / min(count, BASELINE_WINDOW_WEEKS)
+            delta = value - means[slot]
+            means[slot] += weight * delta
+            variances[slot] = (1.0 - weight) * (variances[slot] + weight * delta * delta)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from homeassistant.components.binary_sensor import BinarySensorDeviceClass, BinarySensorEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.util import dt as dt_util
+
+from .const import ANOMALY_Z_THRESHOLD, DATA_COORDINATOR, DOMAIN
+from .coordinator import OmaHelenCoordinator
+from .entity import OmaHelenEntity
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    coordinator: OmaHelenCoordinator = hass.data[DOMAIN][entry.entry_id][DATA_COORDINATOR]
+    async_add_entities([OmaHelenConsumptionAnomalySensor(coordinator, entry)])
+
+
+class OmaHelenConsumptionAnomalySensor(OmaHelenEntity, BinarySensorEntity):
+    _attr_icon = "mdi:home-alert"
+    _attr_name = "Consumption anomaly"
+    _attr_device_class = BinarySensorDeviceClass.PROBLEM
+
+    def __init__(self, coordinator: OmaHelenCoordinator, entry: ConfigEntry) -> None:
+        super().__init__(coordinator, entry)
+        self._attr_unique_id = f"{self._delivery_site_id}_consumption_anomaly"
+
+    @property
+    def is_on(self) -> bool | None:
+        # Unknown until the baseline has enough weeks of history.
+        check = self.coordinator.consumption_check
+        if check is None:
+            return None
+        return abs(check.z_score) >= ANOMALY_Z_THRESHOLD
+
+    @property
+    def extra_state_attributes(self) -> dict[str, object] | None:
+        check = self.coordinator.consumption_check
+        if check is None:
+            return None
+        return {
+            "period_start": dt_util.utc_from_timestamp(check.start).isoformat(),
+            "period_end": dt_util.utc_from_timestamp(check.end).isoformat(),
+            "actual_kwh": round(check.actual_kwh, 3),
+            "expected_kwh": round(check.expected_kwh, 3),
+            "z_score": round(check.z_score, 2),
+        }
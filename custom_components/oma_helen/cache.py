@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from functools import partial
+from datetime import date, datetime, timedelta
+from itertools import islice
+import logging
+import math
+from operator import le
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .api import parse_timestamp, spot_price
+from .const import (
+    CACHE_MAX_DAYS,
+    CACHE_SAVE_DELAY,
+    CACHE_STORAGE_VERSION,
+    DOMAIN,
+    INTERVAL_SECONDS,
+    RESOLUTION_SECONDS,
+)
+from .statistics import PointColumns
+from .timeutil import HELEN_TIME_ZONE, local_day, local_day_bounds
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _CachedDay:
+    starts: array
+    electricity: array
+    spot_price_c_per_kwh: array
+    settled: bool
+    fetched_at: float
+    # 1 where the spot price came without VAT.
+    spot_excludes_vat: array = field(default_factory=lambda: array("b"))
+
+
+class OmaHelenResponseCache:
+    """Raw quarter-hour series per local day, stored in one file per local month.
+
+    Settled months are written once and then left alone, so the frequent saves
+    after a price refresh or an intraday poll only rewrite the current month.
+    A small index file lists the months that have a file.
+    """
+
+    def __init__(self, hass: HomeAssistant, delivery_site_id: str, resolution: str) -> None:
+        self._hass = hass
+        self._key = f"{DOMAIN}.cache.{delivery_site_id}.{resolution}"
+        self._index: Store[dict[str, Any]] = Store(hass, CACHE_STORAGE_VERSION, self._key)
+        self._month_stores: dict[date, Store[dict[str, Any]]] = {}
+        # Months in the index file, months changed since their save was last
+        # scheduled, and months with a scheduled save that has not run yet.
+        self._stored_months: set[date] = set()
+        self._dirty_months: set[date] = set()
+        self._unsaved_months: set[date] = set()
+        self._index_unsaved = False
+        self._resolution = resolution
+        self._interval = RESOLUTION_SECONDS.get(resolution, INTERVAL_SECONDS)
+        self._days: dict[date, _CachedDay] = {}
+        # Intervals of past unsettled days that lack a value or a spot price, as
+        # [start, end) epoch-second runs. Kept up to date on every ingest.
+        self._gaps: dict[date, list[tuple[float, float]]] = {}
+        self._loaded = False
+
+    async def async_load(self) -> None:
+        if self._loaded:
+            return
+        stored = await self._index.async_load() or {}
+        if "days" in stored:
+            # Written before the cache was split per month; moved over on the
+            # next save.
+            self._load_days(stored["days"])
+            self._dirty_months.update(map(_month_of, self._days))
+        else:
+            self._stored_months = {date.fromisoformat(month) for month in stored.get("months", ())}
+            for month in sorted(self._stored_months):
+                data = await self._month_store(month).async_load() or {}
+                self._load_days(data.get("days", {}))
+        today = datetime.now(HELEN_TIME_ZONE).date()
+        for day, cached in self._days.items():
+            if cached.settled and not self._is_complete(day, cached):
+                # Settled before a missing spot price counted as incomplete.
+                cached.settled = False
+                self._dirty_months.add(_month_of(day))
+            self._index_gaps(day, cached, today)
+        self._loaded = True
+        if self._dirty_months:
+            self.async_schedule_save()
+
+    async def async_remove(self) -> None:
+        if not self._loaded:
+            stored = await self._index.async_load() or {}
+            self._stored_months = {date.fromisoformat(month) for month in stored.get("months", ())}
+        for month in self._stored_months | self._dirty_months:
+            await self._month_store(month).async_remove()
+        await self._index.async_remove()
+        self._days.clear()
+        self._gaps.clear()
+        self._stored_months.clear()
+        self._dirty_months.clear()
+        self._unsaved_months.clear()
+        self._index_unsaved = False
+
+    def missing_ranges(self, start: date, end: date) -> list[tuple[date, date]]:
+        ranges: list[tuple[date, date]] = []
+        day = start
+        while day <= end:
+            cached = self._days.get(day)
+            if cached is None or not cached.settled:
+                if ranges and ranges[-1][1] == day - timedelta(days=1):
+                    ranges[-1] = (ranges[-1][0], day)
+                else:
+                    ranges.append((day, day))
+            day += timedelta(days=1)
+        return ranges
+
+    def first_unsettled_day(self, start: date, end: date) -> date | None:
+        day = start
+        while day <= end:
+            cached = self._days.get(day)
+            if cached is None or not cached.settled:
+                return day
+            day += timedelta(days=1)
+        return None
+
+    def ingest(self, start: date, end: date, series: Iterable[dict[str, Any]]) -> None:
+        fetched_at = dt_util.utcnow().timestamp()
+        days: dict[date, _CachedDay] = {}
+        day = start
+        while day <= end:
+            days[day] = _CachedDay(array("d"), array("d"), array("d"), False, fetched_at)
+            day += timedelta(days=1)
+
+        for entry in series:
+            start_ts = parse_timestamp(entry["start"]).timestamp()
+            cached = days.get(local_day(start_ts))
+            if cached is None:
+                continue
+            electricity = entry.get("electricity")
+            spot = spot_price(entry)
+            cached.starts.append(start_ts)
+            cached.electricity.append(math.nan if electricity is None else float(electricity))
+            cached.spot_price_c_per_kwh.append(math.nan if spot is None else spot[0])
+            cached.spot_excludes_vat.append(spot is not None and not spot[1])
+
+        today = datetime.now(HELEN_TIME_ZONE).date()
+        for day, cached in days.items():
+            # Kept sorted like ingest_intervals does, which bisects into the day.
+            _sort_day(cached)
+            cached.settled = day < today and self._is_complete(day, cached)
+            self._days[day] = cached
+            self._dirty_months.add(_month_of(day))
+            self._index_gaps(day, cached, today)
+        self._evict()
+
+    def ingest_intervals(self, series: Iterable[dict[str, Any]]) -> set[date]:
+        # Merge intervals into the cached days without replacing the rest of the
+        # day, and return the days that gained intervals they were missing.
+        # Intervals Helen has not measured yet are left for a later fetch.
+        fetched_at = dt_util.utcnow().timestamp()
+        touched: set[date] = set()
+        gained: set[date] = set()
+        for entry in series:
+            electricity = entry.get("electricity")
+            if electricity is None:
+                continue
+            start_ts = parse_timestamp(entry["start"]).timestamp()
+            day = local_day(start_ts)
+            cached = self._days.get(day)
+            if cached is None:
+                cached = self._days[day] = _CachedDay(array("d"), array("d"), array("d"), False, fetched_at)
+            elif cached.settled:
+                continue
+            spot = spot_price(entry)
+            spot_value, excludes_vat = (math.nan, False) if spot is None else (spot[0], not spot[1])
+            idx = bisect_left(cached.starts, start_ts)
+            if idx < len(cached.starts) and cached.starts[idx] == start_ts:
+                cached_spot = cached.spot_price_c_per_kwh[idx]
+                if math.isnan(cached.electricity[idx]) or (
+                    math.isnan(cached_spot) and spot is not None
+                ):
+                    gained.add(day)
+                cached.electricity[idx] = float(electricity)
+                if spot is not None:
+                    cached.spot_price_c_per_kwh[idx] = spot_value
+                    cached.spot_excludes_vat[idx] = excludes_vat
+            else:
+                cached.starts.insert(idx, start_ts)
+                cached.electricity.insert(idx, float(electricity))
+                cached.spot_price_c_per_kwh.insert(idx, spot_value)
+                cached.spot_excludes_vat.insert(idx, excludes_vat)
+                gained.add(day)
+            cached.fetched_at = fetched_at
+            touched.add(day)
+
+        today = datetime.now(HELEN_TIME_ZONE).date()
+        for day in touched:
+            cached = self._days[day]
+            cached.settled = day < today and self._is_complete(day, cached)
+            self._dirty_months.add(_month_of(day))
+            self._index_gaps(day, cached, today)
+        self._evict()
+        return gained
+
+    def gap_days(self, start: date, end: date) -> list[date]:
+        return sorted(day for day in self._gaps if start <= day <= end)
+
+    def gaps(self, day: date) -> list[tuple[float, float]]:
+        return self._gaps.get(day, [])
+
+    def gap_counts(self) -> dict[date, int]:
+        # Quarter-hours per day missing a value or a spot price.
+        return {
+            day: sum(int((end - start) // self._interval) for start, end in runs)
+            for day, runs in sorted(self._gaps.items())
+        }
+
+    def covered_until(self, start: date, end: date) -> float:
+        # End of the newest cached interval in the range, or the start of the range.
+        latest = local_day_bounds(start)[0]
+        day = start
+        while day <= end:
+            cached = self._days.get(day)
+            if cached is not None:
+                for start_ts, electricity in zip(reversed(cached.starts), reversed(cached.electricity)):
+                    if not math.isnan(electricity):
+                        latest = max(latest, start_ts + self._interval)
+                        break
+            day += timedelta(days=1)
+        return latest
+
+    def columns(self, start: date, end: date) -> PointColumns:
+        # Helen reports energy fed into the grid as negative electricity; it is
+        # split into consumption and production in the same pass.
+        columns = PointColumns()
+        production = columns.production_kwh = array("d")
+        excludes_vat = columns.spot_excludes_vat = array("d")
+        day = start
+        while day <= end:
+            cached = self._days.get(day)
+            if cached is not None:
+                for start_ts, electricity, spot, spot_excludes_vat in zip(
+                    cached.starts,
+                    cached.electricity,
+                    cached.spot_price_c_per_kwh,
+                    cached.spot_excludes_vat,
+                ):
+                    if math.isnan(electricity):
+                        continue
+                    columns.append(
+                        start_ts,
+                        electricity if electricity > 0.0 else 0.0,
+                        None if math.isnan(spot) else spot,
+                    )
+                    production.append(-electricity if electricity < 0.0 else 0.0)
+                    excludes_vat.append(spot_excludes_vat)
+            day += timedelta(days=1)
+        return columns
+
+    def async_schedule_save(self) -> None:
+        months = {_month_of(day) for day in self._days}
+        for month in self._dirty_months:
+            if month in months:
+                self._month_store(month).async_delay_save(
+                    partial(self._month_data_to_save, month), CACHE_SAVE_DELAY
+                )
+                self._unsaved_months.add(month)
+            else:
+                # Every day of the month was evicted.
+                self._hass.async_create_task(self._month_store(month).async_remove())
+                self._month_stores.pop(month)
+                self._unsaved_months.discard(month)
+        self._dirty_months.clear()
+        if months != self._stored_months:
+            self._stored_months = months
+            self._index.async_delay_save(self._index_data_to_save, CACHE_SAVE_DELAY)
+            self._index_unsaved = True
+
+    async def async_flush(self) -> None:
+        # Write pending saves now. Saving also cancels the delayed write, so
+        # nothing is written after the entry unloads and its files are removed.
+        self.async_schedule_save()
+        for month in sorted(self._unsaved_months):
+            await self._month_store(month).async_save(self._month_data_to_save(month))
+        if self._index_unsaved:
+            await self._index.async_save(self._index_data_to_save())
+
+    def _month_store(self, month: date) -> Store[dict[str, Any]]:
+        store = self._month_stores.get(month)
+        if store is None:
+            store = self._month_stores[month] = Store(
+                self._hass, CACHE_STORAGE_VERSION, f"{self._key}.{month:%Y-%m}"
+            )
+        return store
+
+    def _load_days(self, days: dict[str, Any]) -> None:
+        for day_str, raw in days.items():
+            self._days[date.fromisoformat(day_str)] = _CachedDay(
+                starts=array("d", raw["t"]),
+                electricity=array("d", (math.nan if v is None else v for v in raw["e"])),
+                spot_price_c_per_kwh=array("d", (math.nan if v is None else v for v in raw["p"])),
+                settled=raw["s"],
+                fetched_at=raw["f"],
+                # Only written for days with a price without VAT.
+                spot_excludes_vat=array("b", raw.get("x") or bytes(len(raw["t"]))),
+            )
+
+    def _index_data_to_save(self) -> dict[str, Any]:
+        self._index_unsaved = False
+        return {"months": [month.isoformat() for month in sorted(self._stored_months)]}
+
+    def _month_data_to_save(self, month: date) -> dict[str, Any]:
+        self._unsaved_months.discard(month)
+        days = {}
+        day = month
+        while day.month == month.month:
+            cached = self._days.get(day)
+            if cached is not None:
+                raw = days[day.isoformat()] = {
+                    "t": [int(ts) for ts in cached.starts],
+                    "e": _to_json_list(cached.electricity),
+                    "p": _to_json_list(cached.spot_price_c_per_kwh),
+                    "s": cached.settled,
+                    "f": cached.fetched_at,
+                }
+                if any(cached.spot_excludes_vat):
+                    raw["x"] = list(cached.spot_excludes_vat)
+            day += timedelta(days=1)
+        return {"days": days}
+
+    def _is_complete(self, day: date, cached: _CachedDay) -> bool:
+        day_start, day_end = local_day_bounds(day)
+        expected = int((day_end - day_start) // self._interval)
+        if len(cached.starts) < expected:
+            return False
+        # A missing spot price leaves the interval without energy cost, so it is
+        # fetched again like a missing value.
+        return not any(
+            math.isnan(electricity) or math.isnan(spot)
+            for electricity, spot in zip(cached.electricity, cached.spot_price_c_per_kwh)
+        )
+
+    def _index_gaps(self, day: date, cached: _CachedDay, today: date) -> None:
+        if cached.settled or day >= today:
+            self._gaps.pop(day, None)
+            return
+        present = {
+            start_ts
+            for start_ts, electricity, spot in zip(
+                cached.starts, cached.electricity, cached.spot_price_c_per_kwh
+            )
+            if not math.isnan(electricity) and not math.isnan(spot)
+        }
+        day_start, day_end = local_day_bounds(day)
+        runs: list[tuple[float, float]] = []
+        slot = day_start
+        while slot < day_end:
+            if slot not in present:
+                if runs and runs[-1][1] == slot:
+                    runs[-1] = (runs[-1][0], slot + self._interval)
+                else:
+                    runs.append((slot, slot + self._interval))
+            slot += self._interval
+        if runs:
+            self._gaps[day] = runs
+        else:
+            self._gaps.pop(day, None)
+
+    def _evict(self) -> None:
+        overflow = len(self._days) - CACHE_MAX_DAYS
+        if overflow <= 0:
+            return
+        for day in sorted(self._days)[:overflow]:
+            del self._days[day]
+            self._gaps.pop(day, None)
+            self._dirty_months.add(_month_of(day))
+        _LOGGER.debug("Evicted %d days from the Oma Helen response cache", overflow)
+
+
+def _sort_day(cached: _CachedDay) -> None:
+    starts = cached.starts
+    if all(map(le, starts, islice(starts, 1, None))):
+        return
+    order = sorted(range(len(starts)), key=starts.__getitem__)
+    cached.starts = array("d", map(starts.__getitem__, order))
+    cached.electricity = array("d", map(cached.electricity.__getitem__, order))
+    cached.spot_price_c_per_kwh = array("d", map(cached.spot_price_c_per_kwh.__getitem__, order))
+    cached.spot_excludes_vat = array("b", map(cached.spot_excludes_vat.__getitem__, order))
+
+
+def _to_json_list(column: array) -> list[float | None]:
+    return [None if math.isnan(value) else value for value in column]
+
+
+def _month_of(day: date) -> date:
+    return day.replace(day=1)
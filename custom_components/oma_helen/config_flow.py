@@ -7,22 +7,39 @@ import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 
 from . import api
 from .const import (
+    AGGREGATION_DAY,
+    AGGREGATION_HOUR,
     CONF_ACCESS_TOKEN,
+    CONF_AGGREGATION,
     CONF_BACKFILL_DAYS,
     CONF_DELIVERY_SITE_ID,
     CONF_ENABLE_COST,
-    CONF_INITIAL_BACKFILL_DONE,
+    CONF_ENERGY_MARGIN_C_PER_KWH,
+    CONF_FEED_IN_MARGIN_C_PER_KWH,
+    CONF_FETCH_CONCURRENCY,
+    CONF_INTRADAY,
+    CONF_STORE_PASSWORD,
+    CONF_TRANSFER_BASE_EUR_PER_MONTH,
+    CONF_TRANSFER_FEE_C_PER_KWH,
+    CONF_VAT_RATE,
+    DEFAULT_AGGREGATION,
     DEFAULT_BACKFILL_DAYS,
+    DEFAULT_FETCH_CONCURRENCY,
+    DEFAULT_VAT_RATE,
     DOMAIN,
+    MAX_FETCH_CONCURRENCY,
 )
 
 
 @dataclass(slots=True)
 class _PendingSetup:
+    username: str
+    # Only kept when the user opted in to automatic session renewal.
+    password: str | None
     access_token: str
     backfill_days: int
     enable_cost: bool
@@ -34,6 +51,11 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     _pending: _PendingSetup | None = None
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> OptionsFlowHandler:
+        return OptionsFlowHandler(config_entry)
+
     async def async_step_user(self, user_input: dict[str, Any] | None = None):
         errors: dict[str, str] = {}
 
@@ -44,13 +66,15 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             enable_cost = bool(user_input[CONF_ENABLE_COST])
 
             try:
-                login_result = await self.hass.async_add_executor_job(api.login, username, password)
+                login_result = await api.async_login(self.hass, username, password)
             except api.OmaHelenAuthError:
                 errors["base"] = "auth"
             except Exception:
                 errors["base"] = "unknown"
             else:
                 self._pending = _PendingSetup(
+                    username=username,
+                    password=password if user_input.get(CONF_STORE_PASSWORD) else None,
                     access_token=login_result.access_token,
                     backfill_days=backfill_days,
                     enable_cost=enable_cost,
@@ -67,6 +91,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Required(CONF_PASSWORD): str,
                 vol.Optional(CONF_BACKFILL_DAYS, default=DEFAULT_BACKFILL_DAYS): vol.Coerce(int),
                 vol.Optional(CONF_ENABLE_COST, default=False): bool,
+                vol.Optional(CONF_STORE_PASSWORD, default=False): bool,
             }
         )
         return self.async_show_form(step_id="user", data_schema=data_schema, errors=errors)
@@ -95,12 +120,14 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self._abort_if_unique_id_configured()
 
         data = {
+            CONF_USERNAME: self._pending.username,
             CONF_ACCESS_TOKEN: self._pending.access_token,
             CONF_DELIVERY_SITE_ID: delivery_site_id,
             CONF_BACKFILL_DAYS: self._pending.backfill_days,
             CONF_ENABLE_COST: self._pending.enable_cost,
-            CONF_INITIAL_BACKFILL_DONE: False,
         }
+        if self._pending.password is not None:
+            data[CONF_PASSWORD] = self._pending.password
         title = f"Oma Helen {delivery_site_id}"
         return self.async_create_entry(title=title, data=data)
 
@@ -111,13 +138,15 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return await self.async_step_reauth_confirm()
 
     async def async_step_reauth_confirm(self, user_input: dict[str, Any] | None = None):
+        from .coordinator import account_key
+
         errors: dict[str, str] = {}
 
         if user_input is not None:
             username = user_input[CONF_USERNAME]
             password = user_input[CONF_PASSWORD]
             try:
-                login_result = await self.hass.async_add_executor_job(api.login, username, password)
+                login_result = await api.async_login(self.hass, username, password)
             except api.OmaHelenAuthError:
                 errors["base"] = "auth"
             except Exception:
@@ -125,16 +154,28 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             else:
                 entry = self.hass.config_entries.async_get_entry(self.context["reauth_entry_id"])
                 if entry is not None:
-                    new_data = dict(entry.data)
-                    new_data[CONF_ACCESS_TOKEN] = login_result.access_token
-                    self.hass.config_entries.async_update_entry(entry, data=new_data)
-                    await self.hass.config_entries.async_reload(entry.entry_id)
+                    # Every delivery site of the account shares the token, so
+                    # renew them together.
+                    key = account_key(entry)
+                    for account_entry in self.hass.config_entries.async_entries(DOMAIN):
+                        if account_entry is not entry and account_key(account_entry) != key:
+                            continue
+                        new_data = dict(account_entry.data)
+                        new_data[CONF_USERNAME] = username
+                        new_data[CONF_ACCESS_TOKEN] = login_result.access_token
+                        if user_input.get(CONF_STORE_PASSWORD):
+                            new_data[CONF_PASSWORD] = password
+                        else:
+                            new_data.pop(CONF_PASSWORD, None)
+                        self.hass.config_entries.async_update_entry(account_entry, data=new_data)
+                        await self.hass.config_entries.async_reload(account_entry.entry_id)
                 return self.async_abort(reason="reauth_successful")
 
         data_schema = vol.Schema(
             {
                 vol.Required(CONF_USERNAME): str,
                 vol.Required(CONF_PASSWORD): str,
+                vol.Optional(CONF_STORE_PASSWORD, default=False): bool,
             }
         )
         return self.async_show_form(
@@ -142,3 +183,48 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             data_schema=data_schema,
             errors=errors,
         )
+
+
+class OptionsFlowHandler(config_entries.OptionsFlowWithConfigEntry):
+    async def async_step_init(self, user_input: dict[str, Any] | None = None):
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        data_schema = vol.Schema(
+            {
+                vol.Optional(
+                    CONF_FETCH_CONCURRENCY,
+                    default=options.get(CONF_FETCH_CONCURRENCY, DEFAULT_FETCH_CONCURRENCY),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=MAX_FETCH_CONCURRENCY)),
+                vol.Optional(
+                    CONF_AGGREGATION,
+                    default=options.get(CONF_AGGREGATION, DEFAULT_AGGREGATION),
+                ): vol.In([AGGREGATION_HOUR, AGGREGATION_DAY]),
+                vol.Optional(
+                    CONF_INTRADAY,
+                    default=options.get(CONF_INTRADAY, False),
+                ): bool,
+                vol.Optional(
+                    CONF_VAT_RATE,
+                    default=options.get(CONF_VAT_RATE, DEFAULT_VAT_RATE),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+                vol.Optional(
+                    CONF_ENERGY_MARGIN_C_PER_KWH,
+                    default=options.get(CONF_ENERGY_MARGIN_C_PER_KWH, 0.0),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Optional(
+                    CONF_TRANSFER_FEE_C_PER_KWH,
+                    default=options.get(CONF_TRANSFER_FEE_C_PER_KWH, 0.0),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Optional(
+                    CONF_TRANSFER_BASE_EUR_PER_MONTH,
+                    default=options.get(CONF_TRANSFER_BASE_EUR_PER_MONTH, 0.0),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Optional(
+                    CONF_FEED_IN_MARGIN_C_PER_KWH,
+                    default=options.get(CONF_FEED_IN_MARGIN_C_PER_KWH, 0.0),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=data_schema)
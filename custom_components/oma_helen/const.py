@@ -6,23 +6,100 @@ CONF_ACCESS_TOKEN = "access_token"
 CONF_DELIVERY_SITE_ID = "delivery_site_id"
 CONF_BACKFILL_DAYS = "backfill_days"
 CONF_ENABLE_COST = "enable_cost"
+CONF_FETCH_CONCURRENCY = "fetch_concurrency"
+CONF_AGGREGATION = "aggregation"
+CONF_INTRADAY = "intraday"
+CONF_STORE_PASSWORD = "store_password"
 
 CONF_VAT_RATE = "vat_rate"
 CONF_ENERGY_MARGIN_C_PER_KWH = "energy_margin_c_per_kwh"
 CONF_TRANSFER_FEE_C_PER_KWH = "transfer_fee_c_per_kwh"
 CONF_TRANSFER_BASE_EUR_PER_MONTH = "transfer_base_eur_per_month"
+CONF_FEED_IN_MARGIN_C_PER_KWH = "feed_in_margin_c_per_kwh"
 
 DEFAULT_BACKFILL_DAYS = 7
+DEFAULT_VAT_RATE = 25.5
+BACKFILL_WINDOW_DAYS = 31
+DEFAULT_FETCH_CONCURRENCY = 3
+MAX_FETCH_CONCURRENCY = 6
+ACCOUNT_FETCH_CONCURRENCY = 6
+SETTLE_GRACE_DAYS = 3
+INTRADAY_POLL_MINUTES = 60
+
+GAP_FILL_MAX_AGE_DAYS = 31
+GAP_FILL_MAX_REQUESTS = 4
+GAP_FILL_RETRY_HOURS = 6
+GAP_FILL_MERGE_HOURS = 2
+
+TOKEN_REFRESH_MARGIN_MINUTES = 15
+
+RETRY_ATTEMPTS = 4
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 60.0
+RETRY_AFTER_MAX_SECONDS = 300.0
+
+AGGREGATION_HOUR = "hour"
+AGGREGATION_DAY = "day"
+DEFAULT_AGGREGATION = AGGREGATION_HOUR
 
 DATA_COORDINATOR = "coordinator"
+DATA_ACCOUNTS = "accounts"
+DATA_SCHEDULE = "schedule"
+
+RESOLUTION_QUARTER = "quarter"
+RESOLUTION_HOUR = "hour"
+# Seconds per measurement interval: quarter-hours unless a resolution says otherwise.
+INTERVAL_SECONDS = 900
+RESOLUTION_SECONDS = {RESOLUTION_QUARTER: INTERVAL_SECONDS, RESOLUTION_HOUR: 3600}
+
+CACHE_STORAGE_VERSION = 1
+CACHE_MAX_DAYS = 1100
+CACHE_SAVE_DELAY = 60
+
+STATE_STORAGE_VERSION = 1
+STATE_SAVE_DELAY = 10
+
+SCHEDULE_STORAGE_VERSION = 1
+SCHEDULE_SAVE_DELAY = 60
+
+METRICS_HISTORY_SIZE = 20
+
+BASELINE_MIN_SAMPLES = 3
+BASELINE_WINDOW_WEEKS = 12
+ANOMALY_CHECK_INTERVALS = 96
+ANOMALY_Z_THRESHOLD = 3.0
 
 STATS_SOURCE = "oma_helen"
 
+STAT_CONSUMPTION = "consumption"
+STAT_COST = "cost"
+STAT_TRANSFER_COST = "transfer_cost"
+STAT_TOTAL_COST = "total_cost"
+STAT_EXPECTED_CONSUMPTION = "expected_consumption"
+STAT_PRODUCTION = "production"
+STAT_NET_CONSUMPTION = "net_consumption"
+STAT_FEED_IN_REVENUE = "feed_in_revenue"
+
+# Import progress used to live in ConfigEntry.data; kept for migration.
 CONF_LAST_FETCHED_DATE = "last_fetched_date"
+CONF_LAST_IMPORTED_UNTIL = "last_imported_until"
+CONF_PROVISIONAL_UNTIL = "provisional_until"
 CONF_INITIAL_BACKFILL_DONE = "initial_backfill_done"
 CONF_LAST_SUM_KWH = "last_sum_kwh"
 CONF_LAST_SUM_COST = "last_sum_cost"
+CONF_LAST_SUM_TRANSFER_COST = "last_sum_transfer_cost"
+CONF_LAST_SUM_TOTAL_COST = "last_sum_total_cost"
 
 SERVICE_REFRESH_STATISTICS = "refresh_statistics"
 ATTR_START_DATE = "start_date"
 ATTR_END_DATE = "end_date"
+
+SERVICE_FIND_CHEAPEST_WINDOW = "find_cheapest_window"
+ATTR_DURATION = "duration"
+ATTR_EARLIEST_START = "earliest_start"
+ATTR_DEADLINE = "deadline"
+ATTR_LOAD_PROFILE = "load_profile"
+ATTR_CONTIGUOUS = "contiguous"
+
+SERVICE_EXPORT = "export"
+EXPORT_DIRECTORY = "oma_helen_exports"
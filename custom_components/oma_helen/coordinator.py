@@ -1,72 +1,466 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from array import array
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Iterator
+from contextlib import aclosing, contextmanager
+from dataclasses import dataclass, replace
 from datetime import date, datetime, timedelta
 import logging
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers.event import async_track_point_in_utc_time
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.util import dt as dt_util
 
 from . import api
+from .baseline import ConsumptionCheck
+from .cache import OmaHelenResponseCache
 from .const import (
+    ACCOUNT_FETCH_CONCURRENCY,
+    ANOMALY_CHECK_INTERVALS,
+    BACKFILL_WINDOW_DAYS,
     CONF_ACCESS_TOKEN,
+    CONF_AGGREGATION,
     CONF_BACKFILL_DAYS,
     CONF_DELIVERY_SITE_ID,
     CONF_ENABLE_COST,
-    CONF_INITIAL_BACKFILL_DONE,
-    CONF_LAST_FETCHED_DATE,
-    CONF_LAST_SUM_COST,
-    CONF_LAST_SUM_KWH,
+    CONF_FETCH_CONCURRENCY,
+    CONF_INTRADAY,
+    DEFAULT_AGGREGATION,
+    DEFAULT_FETCH_CONCURRENCY,
     DOMAIN,
-    STATS_SOURCE,
+    GAP_FILL_MAX_AGE_DAYS,
+    GAP_FILL_MAX_REQUESTS,
+    GAP_FILL_MERGE_HOURS,
+    GAP_FILL_RETRY_HOURS,
+    INTERVAL_SECONDS,
+    INTRADAY_POLL_MINUTES,
+    RESOLUTION_QUARTER,
+    SETTLE_GRACE_DAYS,
+    TOKEN_REFRESH_MARGIN_MINUTES,
 )
+from .cost import Tariff, apply_tariff, include_spot_vat
+from .metrics import (
+    STAGE_AGGREGATE,
+    STAGE_BUILD_STATISTICS,
+    STAGE_CLIENT,
+    STAGE_FETCH,
+    STAGE_INSERT,
+    STAGE_PARSE,
+    MetricsHistory,
+    RunMetrics,
+)
+from .prices import SpotPriceIndex
+from .retry import async_retry
+from .scheduler import EVENT_CONSUMPTION, EVENT_SPOT_PRICES, PublicationSchedule
+from .state import ImportState, OmaHelenImportStateStore
 from .statistics import (
-    ConsumptionAndCostPoint,
-    build_cost_statistic_id,
-    build_consumption_statistic_id,
+    STATISTIC_KINDS,
+    PointColumns,
+    aggregate_points,
+    async_get_last_sum_before,
+    build_statistic_id,
     build_statistics,
     insert_statistics,
+    statistic_kinds,
 )
+from .timeutil import local_day_range
 
 _LOGGER = logging.getLogger(__name__)
 
+_TOKEN_REFRESH_MARGIN = timedelta(minutes=TOKEN_REFRESH_MARGIN_MINUTES)
+_TOKEN_RENEW_RETRY = timedelta(minutes=5)
+_GAP_FILL_RETRY_SECONDS = GAP_FILL_RETRY_HOURS * 3600
+_GAP_FILL_MERGE_SECONDS = GAP_FILL_MERGE_HOURS * 3600
+
 
 @dataclass(frozen=True, slots=True)
 class CoordinatorData:
     last_imported_date: date | None
     last_interval_start: datetime | None
     last_spot_price_eur_per_kwh: float | None
+    provisional_until: datetime | None = None
+
+
+def account_key(entry: ConfigEntry) -> str:
+    # Entries created before the username was stored share the token issued by
+    # the login that created them.
+    return str(entry.data.get(CONF_USERNAME) or entry.data[CONF_ACCESS_TOKEN])
+
+
+class OmaHelenAccountCoordinator(DataUpdateCoordinator[dict[str, CoordinatorData | Exception]]):
+    """Polls every delivery site of one Oma Helen account with a shared client."""
+
+    def __init__(
+        self, hass: HomeAssistant, key: str, schedule: PublicationSchedule, title: str
+    ) -> None:
+        # Named after the entry that set the account up; the key may be a token.
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}:account:{title}",
+            update_interval=min(
+                schedule.next_interval(event, False, 0, dt_util.utcnow())
+                for event in (EVENT_CONSUMPTION, EVENT_SPOT_PRICES)
+            ),
+        )
+        self.key = key
+        self._schedule = schedule
+        self._attempts = {EVENT_CONSUMPTION: 0, EVENT_SPOT_PRICES: 0}
+        self.fetch_semaphore = asyncio.Semaphore(ACCOUNT_FETCH_CONCURRENCY)
+        self._sites: dict[str, OmaHelenCoordinator] = {}
+        self._client: api.OmaHelenApiClient | None = None
+        self._client_access_token: str | None = None
+        self._client_lock = asyncio.Lock()
+        self._token_refresh_at: datetime | None = None
+        self._last_renew_attempt: datetime | None = None
+        self._unsub_token_refresh: CALLBACK_TYPE | None = None
+
+    @property
+    def sites(self) -> list[OmaHelenCoordinator]:
+        return list(self._sites.values())
+
+    def add_site(self, site: OmaHelenCoordinator) -> None:
+        self._sites[site.delivery_site_id] = site
+
+    def remove_site(self, site: OmaHelenCoordinator) -> None:
+        if self._sites.get(site.delivery_site_id) is site:
+            del self._sites[site.delivery_site_id]
+
+    async def async_refresh_range(self, start: date, end: date) -> None:
+        results = await asyncio.gather(
+            *(site.async_refresh_range(start, end) for site in self.sites),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def _async_update_data(self) -> dict[str, CoordinatorData | Exception]:
+        sites = self.sites
+        results = await asyncio.gather(
+            *(site.async_poll() for site in sites), return_exceptions=True
+        )
+        data: dict[str, CoordinatorData | Exception] = {}
+        for site, result in zip(sites, results):
+            if isinstance(result, ConfigEntryAuthFailed):
+                site.entry.async_start_reauth(self.hass)
+            elif isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+            data[site.delivery_site_id] = result
+
+        self._schedule_next_poll(data)
+        return data
+
+    def _schedule_next_poll(self, data: dict[str, CoordinatorData | Exception]) -> None:
+        now = dt_util.utcnow()
+        today = dt_util.now().date()
+        yesterday = today - timedelta(days=1)
+        tomorrow_end = local_day_range(today, today + timedelta(days=1))[1].timestamp()
+        published = {
+            EVENT_CONSUMPTION: all(
+                isinstance(result, CoordinatorData)
+                and result.last_imported_date is not None
+                and result.last_imported_date >= yesterday
+                for result in data.values()
+            ),
+            EVENT_SPOT_PRICES: all(
+                (site.prices.end or 0.0) >= tomorrow_end for site in self._sites.values()
+            ),
+        }
+
+        intervals = []
+        for event, done in published.items():
+            self._schedule.observe(event, done, now)
+            self._attempts[event] = 0 if done else self._attempts[event] + 1
+            intervals.append(
+                self._schedule.next_interval(event, done, self._attempts[event], now)
+            )
+        # The coordinator reads update_interval after this update to schedule the next one.
+        interval = min(intervals)
+        if any(site.intraday for site in self._sites.values()):
+            interval = min(interval, timedelta(minutes=INTRADAY_POLL_MINUTES))
+        self.update_interval = interval
+        _LOGGER.debug("Next Oma Helen poll for account in %s", self.update_interval)
+
+    async def async_shutdown(self) -> None:
+        self._cancel_token_refresh()
+        await super().async_shutdown()
+
+    async def async_get_client(self, delivery_site_id: str) -> api.OmaHelenApiClient:
+        async with self._client_lock:
+            access_token = await self._async_valid_access_token()
+            sites = self.sites
+            try:
+                if self._client is not None and self._client_access_token != access_token:
+                    self._client.set_access_token(access_token)
+                    self._client_access_token = access_token
+                if self._client is None:
+                    self._client = await async_retry(
+                        lambda: api.async_build_client(
+                            self.hass, access_token, [site.delivery_site_id for site in sites]
+                        ),
+                        _log_retry,
+                    )
+                    self._client_access_token = access_token
+                elif not self._client.has_delivery_site(delivery_site_id):
+                    client = self._client
+                    await async_retry(
+                        lambda: client.async_select_delivery_sites([delivery_site_id]),
+                        _log_retry,
+                    )
+            except api.OmaHelenAuthError as exc:
+                self.invalidate_client()
+                raise ConfigEntryAuthFailed("Oma Helen access token is no longer valid") from exc
+            except Exception as exc:
+                self.invalidate_client()
+                raise UpdateFailed("Failed to initialize API client") from exc
+
+            if not self._client.has_delivery_site(delivery_site_id):
+                raise UpdateFailed("Invalid delivery site")
+            return self._client
+
+    def invalidate_client(self) -> None:
+        self._client = None
+        self._client_access_token = None
+
+    async def _async_valid_access_token(self) -> str:
+        # The most recently added entry carries the freshest token.
+        access_token: str = self.sites[-1].entry.data[CONF_ACCESS_TOKEN]
+        expires = api.token_expiry(access_token)
+        if expires is None:
+            # Not a JWT we can read; expiry shows up as a rejected request instead.
+            return access_token
+
+        now = dt_util.utcnow()
+        if expires - _TOKEN_REFRESH_MARGIN <= now and (
+            self._last_renew_attempt is None or now - self._last_renew_attempt >= _TOKEN_RENEW_RETRY
+        ):
+            self._last_renew_attempt = now
+            access_token = await self._async_renew_access_token() or access_token
+            expires = api.token_expiry(access_token) or expires
+        if expires <= now:
+            # Do not spend a request on a token that is known to be expired.
+            raise ConfigEntryAuthFailed("Oma Helen access token has expired")
+        self._schedule_token_refresh(expires, now)
+        return access_token
+
+    async def _async_renew_access_token(self) -> str | None:
+        credentials = self._stored_credentials()
+        if credentials is None:
+            return None
+        try:
+            login_result = await api.async_login(self.hass, *credentials)
+        except api.OmaHelenAuthError:
+            _LOGGER.warning("Stored Oma Helen password was rejected; sign in again when asked")
+            return None
+        except Exception as exc:
+            _LOGGER.warning("Failed to renew the Oma Helen session: %s", exc)
+            return None
+
+        access_token = login_result.access_token
+        # Every delivery site of the account shares the token, including entries
+        # that are not loaded right now.
+        for entry in self.hass.config_entries.async_entries(DOMAIN):
+            if account_key(entry) == self.key:
+                self.hass.config_entries.async_update_entry(
+                    entry, data={**entry.data, CONF_ACCESS_TOKEN: access_token}
+                )
+        _LOGGER.debug("Renewed the Oma Helen session for %d delivery sites", len(self._sites))
+        return access_token
+
+    def _stored_credentials(self) -> tuple[str, str] | None:
+        for site in reversed(self.sites):
+            data = site.entry.data
+            if data.get(CONF_USERNAME) and data.get(CONF_PASSWORD):
+                return data[CONF_USERNAME], data[CONF_PASSWORD]
+        return None
+
+    def _schedule_token_refresh(self, expires: datetime, now: datetime) -> None:
+        if self._stored_credentials() is None:
+            return
+        # After a failed renewal, try again a little later while the token lasts.
+        refresh_at = max(expires - _TOKEN_REFRESH_MARGIN, now + _TOKEN_RENEW_RETRY)
+        if refresh_at >= expires or (
+            self._token_refresh_at is not None and self._token_refresh_at <= refresh_at
+        ):
+            return
+        self._cancel_token_refresh()
+        self._token_refresh_at = refresh_at
+        self._unsub_token_refresh = async_track_point_in_utc_time(
+            self.hass, self._async_token_refresh_due, refresh_at
+        )
+
+    def _cancel_token_refresh(self) -> None:
+        if self._unsub_token_refresh is not None:
+            self._unsub_token_refresh()
+        self._unsub_token_refresh = None
+        self._token_refresh_at = None
+
+    async def _async_token_refresh_due(self, now: datetime) -> None:
+        # Renew in the background so the next poll starts with a fresh token.
+        self._unsub_token_refresh = None
+        self._token_refresh_at = None
+        if not self._sites:
+            return
+        try:
+            await self.async_get_client(self.sites[-1].delivery_site_id)
+        except (ConfigEntryAuthFailed, UpdateFailed) as exc:
+            _LOGGER.debug("Background Oma Helen session renewal failed: %s", exc)
 
 
 class OmaHelenCoordinator(DataUpdateCoordinator[CoordinatorData]):
+    """Per delivery site state; polled by its account coordinator."""
+
     def __init__(
-        self, hass: HomeAssistant, entry: ConfigEntry, update_interval: timedelta
+        self, hass: HomeAssistant, entry: ConfigEntry, account: OmaHelenAccountCoordinator
     ) -> None:
         super().__init__(
             hass,
             _LOGGER,
             name=f"{DOMAIN}:{entry.entry_id}",
-            update_interval=update_interval,
+            update_interval=None,
         )
         self.entry = entry
+        self.account = account
+        self.delivery_site_id = str(entry.data[CONF_DELIVERY_SITE_ID])
+        self.options = dict(entry.options)
+        self._fetch_concurrency = int(
+            entry.options.get(CONF_FETCH_CONCURRENCY, DEFAULT_FETCH_CONCURRENCY)
+        )
+        self._aggregation: str = entry.options.get(CONF_AGGREGATION, DEFAULT_AGGREGATION)
+        self._tariff = Tariff.from_options(entry.options)
+        self.intraday = bool(entry.options.get(CONF_INTRADAY, False))
+        self._cache = OmaHelenResponseCache(hass, self.delivery_site_id, RESOLUTION_QUARTER)
+        self._state = OmaHelenImportStateStore(hass, entry)
+        self.prices = SpotPriceIndex(array("d"), array("d"), INTERVAL_SECONDS)
+        self.metrics = MetricsHistory()
+        # Kept apart so the import sensors never show an export as the last import.
+        self.export_metrics = MetricsHistory()
+        # When the missing intervals of each day were last asked for.
+        self._gap_attempts: dict[date, float] = {}
+        # The account poll, a first refresh and the refresh service may overlap.
+        self._import_lock = asyncio.Lock()
+
+    @callback
+    def async_handle_account_update(self) -> None:
+        result = (self.account.data or {}).get(self.delivery_site_id)
+        if result is None:
+            return
+        if isinstance(result, Exception):
+            self.async_set_update_error(result)
+        else:
+            self.async_set_updated_data(result)
+
+    @property
+    def import_state(self) -> ImportState:
+        return self._state.state
+
+    @property
+    def consumption_check(self) -> ConsumptionCheck | None:
+        return self._state.state.consumption_check
+
+    @property
+    def gap_counts(self) -> dict[date, int]:
+        return self._cache.gap_counts()
+
+    async def async_load_state(self) -> None:
+        await self._state.async_load()
+
+    def restored_data(self) -> CoordinatorData:
+        state = self._state.state
+        return CoordinatorData(
+            last_imported_date=state.last_imported_day,
+            last_interval_start=state.last_interval_start,
+            last_spot_price_eur_per_kwh=state.last_spot_price_eur_per_kwh,
+            provisional_until=state.provisional_until,
+        )
+
+    async def async_flush(self) -> None:
+        await self._state.async_flush()
+        await self._cache.async_flush()
 
     async def async_refresh_range(self, start: date, end: date) -> None:
-        await self._async_fetch_and_insert(start, end, force_overwrite=True)
+        async with self._import_lock:
+            try:
+                await self._async_fetch_and_insert(start, end, force_overwrite=True)
+            finally:
+                # Polls reach the entities through the account; a refresh does not.
+                self.async_update_listeners()
+
+    async def async_iter_export(self, start: date, end: date) -> AsyncIterator[PointColumns]:
+        # Month-sized chunks with the configured tariff applied. Days missing from
+        # the cache are fetched like in a refresh, under the import lock so they do
+        # not race a poll or gap fill; the chunks are then read from the cache
+        # without holding it. Nothing is written to the recorder.
+        await self._cache.async_load()
+        windows = list(_iter_windows(start, end, BACKFILL_WINDOW_DAYS))
+        with self._track_run("export", self.export_metrics) as run:
+            async with self._import_lock:
+                async with aclosing(self._async_fetch_windows(windows, run)) as fetched:
+                    async for _ in fetched:
+                        pass
+            for window_start, window_end in windows:
+                with run.stage(STAGE_AGGREGATE):
+                    columns = self._cache.columns(window_start, window_end)
+                    apply_tariff(columns, self._tariff, INTERVAL_SECONDS)
+                run.points += len(columns)
+                if columns:
+                    yield columns
 
     async def _async_update_data(self) -> CoordinatorData:
+        return await self.async_poll()
+
+    async def async_poll(self) -> CoordinatorData:
+        async with self._import_lock:
+            data = await self._async_poll()
+            try:
+                await self._async_refresh_prices()
+            except UpdateFailed as exc:
+                # Prices are retried on the next poll; the import itself succeeded.
+                _LOGGER.warning("%s: %s", self.entry.title, exc)
+            try:
+                await self._async_fill_gaps()
+            except UpdateFailed as exc:
+                # Gaps are asked for again after GAP_FILL_RETRY_HOURS.
+                _LOGGER.warning("%s: %s", self.entry.title, exc)
+            if self.intraday and self._state.state.initial_backfill_done:
+                data = await self._async_import_provisional(data)
+            return self._remember(data)
+
+    def _remember(self, data: CoordinatorData) -> CoordinatorData:
+        # A poll with nothing new keeps showing the last known interval and price,
+        # which are also what a restart restores.
+        state = self._state.state
+        if data.last_interval_start is None:
+            data = replace(data, last_interval_start=state.last_interval_start)
+        else:
+            state.last_interval_start = data.last_interval_start
+        if data.last_spot_price_eur_per_kwh is None:
+            data = replace(data, last_spot_price_eur_per_kwh=state.last_spot_price_eur_per_kwh)
+        else:
+            state.last_spot_price_eur_per_kwh = data.last_spot_price_eur_per_kwh
+        self._state.async_schedule_save()
+        return data
+
+    async def _async_poll(self) -> CoordinatorData:
         today_local = dt_util.now().date()
         yesterday_local = today_local - timedelta(days=1)
 
-        initial_done = bool(self.entry.data.get(CONF_INITIAL_BACKFILL_DONE, False))
-        last_fetched_str: str | None = self.entry.data.get(CONF_LAST_FETCHED_DATE)
-        last_fetched = date.fromisoformat(last_fetched_str) if last_fetched_str else None
+        initial_done = self._state.state.initial_backfill_done
+        last_fetched = self._state.state.last_imported_day
 
         if not initial_done:
             backfill_days = int(self.entry.data.get(CONF_BACKFILL_DAYS, 0))
             start = today_local - timedelta(days=backfill_days)
+            if last_fetched is not None and last_fetched >= start:
+                # Resume an interrupted backfill from its last checkpoint.
+                start = last_fetched + timedelta(days=1)
             end = yesterday_local
         else:
             start = (last_fetched + timedelta(days=1)) if last_fetched else yesterday_local
@@ -84,72 +478,446 @@ class OmaHelenCoordinator(DataUpdateCoordinator[CoordinatorData]):
     async def _async_fetch_and_insert(
         self, start: date, end: date, force_overwrite: bool
     ) -> CoordinatorData:
-        access_token: str = self.entry.data[CONF_ACCESS_TOKEN]
-        delivery_site_id: str = self.entry.data[CONF_DELIVERY_SITE_ID]
-        enable_cost: bool = bool(self.entry.data.get(CONF_ENABLE_COST, False))
+        with self._track_run("refresh" if force_overwrite else "poll") as run:
+            return await self._async_fetch_and_insert_windows(start, end, force_overwrite, run)
+
+    @contextmanager
+    def _track_run(self, kind: str, history: MetricsHistory | None = None) -> Iterator[RunMetrics]:
+        run = RunMetrics(kind)
+        error: BaseException | None = None
+        try:
+            yield run
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            run.finish(error)
+            (self.metrics if history is None else history).record(run)
+            _LOGGER.debug("%s %s run: %s", self.entry.title, kind, run.as_dict())
 
+    async def _async_fetch_and_insert_windows(
+        self, start: date, end: date, force_overwrite: bool, run: RunMetrics
+    ) -> CoordinatorData:
+        delivery_site_id = self.delivery_site_id
+        await self._cache.async_load()
+
+        data = CoordinatorData(
+            last_imported_date=start - timedelta(days=1),
+            last_interval_start=None,
+            last_spot_price_eur_per_kwh=None,
+        )
+        settle_cutoff = dt_util.now().date() - timedelta(days=SETTLE_GRACE_DAYS)
+        windows = list(_iter_windows(start, end, BACKFILL_WINDOW_DAYS))
+        async with aclosing(self._async_fetch_windows(windows, run)) as fetched:
+            async for window_start, window_end in fetched:
+                stop = False
+                if not force_overwrite:
+                    # Recent days Helen has not completed yet are not checkpointed;
+                    # the next poll fetches and imports them again.
+                    unsettled = self._cache.first_unsettled_day(
+                        max(window_start, settle_cutoff), window_end
+                    )
+                    if unsettled == window_start:
+                        break
+                    if unsettled is not None:
+                        window_end = unsettled - timedelta(days=1)
+                        stop = True
+                window_data = await self._async_import_window(
+                    delivery_site_id,
+                    window_start,
+                    window_end,
+                    force_overwrite=force_overwrite,
+                    backfill_complete=stop or window_end >= end,
+                    run=run,
+                )
+                data = CoordinatorData(
+                    last_imported_date=window_data.last_imported_date,
+                    last_interval_start=window_data.last_interval_start
+                    or data.last_interval_start,
+                    last_spot_price_eur_per_kwh=(
+                        window_data.last_spot_price_eur_per_kwh
+                        if window_data.last_spot_price_eur_per_kwh is not None
+                        else data.last_spot_price_eur_per_kwh
+                    ),
+                )
+                if stop:
+                    break
+        return data
+
+    async def _async_fetch_windows(
+        self, windows: list[tuple[date, date]], run: RunMetrics
+    ) -> AsyncIterator[tuple[date, date]]:
+        # Fetch ahead with a bounded number of workers but hand windows back in
+        # order, so running sums are always committed chronologically.
+        pending: deque[tuple[date, date, asyncio.Task]] = deque()
+        remaining = iter(windows)
         try:
-            client = await self.hass.async_add_executor_job(
-                api.build_client, access_token, delivery_site_id
+            while True:
+                while len(pending) < self._fetch_concurrency:
+                    window = next(remaining, None)
+                    if window is None:
+                        break
+                    pending.append(
+                        (
+                            *window,
+                            self.hass.async_create_task(self._async_fetch_window(*window, run)),
+                        )
+                    )
+                if not pending:
+                    return
+                window_start, window_end, task = pending.popleft()
+                try:
+                    await task
+                except Exception:
+                    # Hand back the leading days of the window that did arrive, so
+                    # they are imported and checkpointed before the error ends the run.
+                    missing = self._cache.missing_ranges(window_start, window_end)
+                    if missing and missing[0][0] > window_start:
+                        yield window_start, missing[0][0] - timedelta(days=1)
+                    raise
+                yield window_start, window_end
+        finally:
+            for _, _, task in pending:
+                if task.done():
+                    if not task.cancelled():
+                        task.exception()
+                else:
+                    task.cancel()
+
+    async def _async_fill_gaps(self) -> None:
+        # Days that were imported with intervals missing are past the settle grace
+        # and no longer fetched by the poll. Ask Helen for just the missing
+        # intervals, a few requests per poll, and rewrite the days that got values.
+        last_imported_day = self._state.state.last_imported_day
+        if last_imported_day is None:
+            return
+        await self._cache.async_load()
+        now = dt_util.utcnow().timestamp()
+        first_day = dt_util.now().date() - timedelta(days=GAP_FILL_MAX_AGE_DAYS)
+        days = [
+            day
+            for day in self._cache.gap_days(first_day, last_imported_day)
+            if now - self._gap_attempts.get(day, 0.0) >= _GAP_FILL_RETRY_SECONDS
+        ]
+        ranges = _merge_gaps(
+            (gap for day in days for gap in self._cache.gaps(day)), _GAP_FILL_MERGE_SECONDS
+        )[:GAP_FILL_MAX_REQUESTS]
+        if not ranges:
+            return
+
+        # Counted as attempted up front, so a failing day is not asked for on
+        # every poll.
+        requested_until = ranges[-1][1]
+        for day in days:
+            if self._cache.gaps(day)[0][0] < requested_until:
+                self._gap_attempts[day] = now
+        for day in [day for day in self._gap_attempts if day < first_day]:
+            del self._gap_attempts[day]
+
+        filled: set[date] = set()
+        with self._track_run("gap_fill") as run:
+            with run.stage(STAGE_CLIENT):
+                client = await self.account.async_get_client(self.delivery_site_id)
+            async with self.account.fetch_semaphore:
+                for range_start, range_end in ranges:
+                    fetch_from = dt_util.utc_from_timestamp(range_start)
+                    fetch_to = dt_util.utc_from_timestamp(range_end)
+                    with run.stage(STAGE_FETCH):
+                        run.requests += 1
+                        body = await self._async_call_api(
+                            lambda: api.async_get_measurements_between(
+                                client,
+                                self.delivery_site_id,
+                                fetch_from,
+                                fetch_to,
+                                RESOLUTION_QUARTER,
+                            ),
+                            f"Failed to fetch missing intervals {fetch_from} to {fetch_to}",
+                            run,
+                        )
+                    run.bytes_received += len(body)
+                    with run.stage(STAGE_PARSE), _parse_errors(self.entry.title):
+                        filled |= self._cache.ingest_intervals(api.iter_series(body))
+                    del body
+                    self._cache.async_schedule_save()
+
+            # Rewritten from the cache like a refresh, which also shifts the sums
+            # of everything imported after them.
+            for start, end in _day_runs(sorted(filled.intersection(days))):
+                await self._async_import_window(
+                    self.delivery_site_id,
+                    start,
+                    end,
+                    force_overwrite=True,
+                    backfill_complete=False,
+                    run=run,
+                )
+        if filled:
+            self.async_update_listeners()
+
+    async def _async_refresh_prices(self) -> None:
+        # Today's and tomorrow's prices come from the same chart-data call as the
+        # measurements; once tomorrow is complete there is nothing left to fetch.
+        today = dt_util.now().date()
+        today_start, tomorrow_end = local_day_range(today, today + timedelta(days=1))
+        if (self.prices.end or 0.0) >= tomorrow_end.timestamp():
+            return
+
+        client = await self.account.async_get_client(self.delivery_site_id)
+        async with self.account.fetch_semaphore:
+            body = await self._async_call_api(
+                lambda: api.async_get_measurements_with_spot_prices(
+                    client,
+                    self.delivery_site_id,
+                    today,
+                    today + timedelta(days=1),
+                    RESOLUTION_QUARTER,
+                ),
+                "Failed to fetch spot prices",
+            )
+
+        await self._cache.async_load()
+        with _parse_errors(self.entry.title):
+            series = list(api.iter_series(body))
+            del body
+            self.prices = SpotPriceIndex.from_series(
+                series, today_start.timestamp(), INTERVAL_SECONDS, self._tariff.vat_rate
             )
-        except api.OmaHelenDeliverySiteError as exc:
-            raise UpdateFailed("Invalid delivery site") from exc
+            # Today's measured intervals come along for free.
+            self._cache.ingest_intervals(series)
+        self._cache.async_schedule_save()
+
+    async def _async_import_provisional(self, data: CoordinatorData) -> CoordinatorData:
+        # Intervals after the settled checkpoint are imported on top of the settled
+        # sums without moving the checkpoint, so the settled import that follows
+        # simply writes over them.
+        last_imported_day = self._state.state.last_imported_day
+        if last_imported_day is None:
+            return data
+        first_day = last_imported_day + timedelta(days=1)
+        today = dt_util.now().date()
+        if first_day > today:
+            return data
+
+        await self._cache.async_load()
+        now = dt_util.utcnow()
+        fetch_from = dt_util.utc_from_timestamp(self._cache.covered_until(first_day, today))
+        if now - fetch_from >= timedelta(seconds=INTERVAL_SECONDS):
+            client = await self.account.async_get_client(self.delivery_site_id)
+            async with self.account.fetch_semaphore:
+                body = await self._async_call_api(
+                    lambda: api.async_get_measurements_between(
+                        client, self.delivery_site_id, fetch_from, now, RESOLUTION_QUARTER
+                    ),
+                    f"Failed to fetch measurements since {fetch_from}",
+                )
+            with _parse_errors(self.entry.title):
+                self._cache.ingest_intervals(api.iter_series(body))
+            del body
+            self._cache.async_schedule_save()
+
+        enable_cost: bool = bool(self.entry.data.get(CONF_ENABLE_COST, False))
+        columns = self._cache.columns(first_day, today)
+        if not columns:
+            return data
+        provisional_until = dt_util.utc_from_timestamp(columns.starts[-1] + INTERVAL_SECONDS)
+        # Provisional intervals are compared with the baseline but not learned from.
+        _, check = self._compare_with_baseline(columns)
+        self._note_production(columns)
+        include_spot_vat(columns, self._tariff.vat_rate)
+        if enable_cost:
+            apply_tariff(columns, self._tariff, INTERVAL_SECONDS)
+        columns = aggregate_points(columns, self._aggregation)
+
+        statistics, last_values = build_statistics(
+            self.hass,
+            self.delivery_site_id,
+            columns,
+            kinds=statistic_kinds(
+                include_cost=enable_cost,
+                include_transfer=self._tariff.has_transfer,
+                include_expected=True,
+                include_production=self._state.state.has_production,
+            ),
+            last_sums=self._stored_sums(),
+        )
+        del columns
+        try:
+            await insert_statistics(self.hass, statistics, force_overwrite=False)
         except Exception as exc:
-            raise UpdateFailed("Failed to initialize API client") from exc
+            raise UpdateFailed("Failed to write provisional statistics") from exc
+
+        self._state.state.provisional_until = provisional_until
+        if check is not None:
+            self._state.state.consumption_check = check
+        self._state.async_schedule_save()
+
+        return CoordinatorData(
+            last_imported_date=data.last_imported_date,
+            last_interval_start=last_values.last_interval_start,
+            last_spot_price_eur_per_kwh=(
+                last_values.last_spot_price_eur_per_kwh
+                if last_values.last_spot_price_eur_per_kwh is not None
+                else data.last_spot_price_eur_per_kwh
+            ),
+            provisional_until=provisional_until,
+        )
+
+    async def _async_fetch_window(self, start: date, end: date, run: RunMetrics) -> None:
+        # Only days that are not cached yet, or were still provisional when they
+        # were cached, go to the network.
+        missing = self._cache.missing_ranges(start, end)
+        if not missing:
+            return
+
+        with run.stage(STAGE_CLIENT):
+            client = await self.account.async_get_client(self.delivery_site_id)
+        async with self.account.fetch_semaphore:
+            for missing_start, missing_end in missing:
+                with run.stage(STAGE_FETCH):
+                    run.requests += 1
+                    body = await self._async_call_api(
+                        lambda: api.async_get_measurements_with_spot_prices(
+                            client,
+                            self.delivery_site_id,
+                            missing_start,
+                            missing_end,
+                            RESOLUTION_QUARTER,
+                        ),
+                        f"Failed to fetch measurements for {missing_start} to {missing_end}",
+                        run,
+                    )
+                # The body is decoded text; Helen's JSON is ASCII, so characters are bytes.
+                run.bytes_received += len(body)
+                with run.stage(STAGE_PARSE), _parse_errors(self.entry.title):
+                    self._cache.ingest(missing_start, missing_end, api.iter_series(body))
+                del body
+                # Saved per range, so ranges fetched before a failure are kept.
+                self._cache.async_schedule_save()
+
+    async def _async_call_api(
+        self,
+        call: Callable[[], Awaitable[str]],
+        failure_message: str,
+        run: RunMetrics | None = None,
+    ) -> str:
+        # Transient errors are retried here while holding the caller's fetch slot,
+        # which also slows the other fetches of the account down when Helen
+        # rate-limits.
+        def on_retry(exc: Exception, delay: float) -> None:
+            if run is not None:
+                run.retries += 1
+            _log_retry(exc, delay)
 
         try:
-            response = await self.hass.async_add_executor_job(
-                api.get_measurements_with_spot_prices,
-                client,
-                start,
-                end,
-                _resolution_quarter(),
-            )
+            return await async_retry(call, on_retry)
+        except api.OmaHelenAuthError as exc:
+            self.account.invalidate_client()
+            raise ConfigEntryAuthFailed("Oma Helen access token is no longer valid") from exc
         except Exception as exc:
-            raise UpdateFailed("Failed to fetch measurements") from exc
+            # The selected contract may have gone stale; rebuild the client next time.
+            self.account.invalidate_client()
+            raise UpdateFailed(failure_message) from exc
 
-        points = _response_to_points(response)
-        if not points:
+    async def _async_import_window(
+        self,
+        delivery_site_id: str,
+        start: date,
+        end: date,
+        *,
+        force_overwrite: bool,
+        backfill_complete: bool,
+        run: RunMetrics,
+    ) -> CoordinatorData:
+        enable_cost: bool = bool(self.entry.data.get(CONF_ENABLE_COST, False))
+        learned: tuple[array, array, ConsumptionCheck | None] | None = None
+        with run.stage(STAGE_AGGREGATE):
+            columns = self._cache.columns(start, end)
+            run.points += len(columns)
+            if columns:
+                if not force_overwrite:
+                    slots, check = self._compare_with_baseline(columns)
+                    learned = (slots, columns.consumption_kwh, check)
+                self._note_production(columns)
+                include_spot_vat(columns, self._tariff.vat_rate)
+                if enable_cost:
+                    apply_tariff(columns, self._tariff, INTERVAL_SECONDS)
+                columns = aggregate_points(columns, self._aggregation)
+        if not columns:
             _LOGGER.warning("No measurement points returned for %s to %s", start, end)
+            if not force_overwrite:
+                self._persist_progress(
+                    last_imported_date=end,
+                    sums=self._stored_sums(),
+                    backfill_complete=backfill_complete,
+                )
             return CoordinatorData(
                 last_imported_date=end,
                 last_interval_start=None,
                 last_spot_price_eur_per_kwh=None,
             )
 
-        consumption_statistic_id = build_consumption_statistic_id(delivery_site_id)
-        cost_statistic_id = build_cost_statistic_id(delivery_site_id) if enable_cost else None
-
-        last_sum_kwh = float(self.entry.data.get(CONF_LAST_SUM_KWH, 0.0))
-        last_sum_cost = float(self.entry.data.get(CONF_LAST_SUM_COST, 0.0))
-
-        consumption_stats, cost_stats, last_values = build_statistics(
-            self.hass,
-            consumption_statistic_id,
-            cost_statistic_id,
-            points,
-            last_sum_kwh=last_sum_kwh,
-            last_sum_cost=last_sum_cost,
+        # Refreshes rewrite history that has already been learned from, so only
+        # the forward import writes expected consumption and updates the baseline.
+        kinds = statistic_kinds(
             include_cost=enable_cost,
+            include_transfer=self._tariff.has_transfer,
+            include_expected=not force_overwrite,
+            include_production=self._state.state.has_production,
         )
+        range_start, range_end = local_day_range(start, end)
+        if force_overwrite:
+            # Anchor on what the recorder holds before this range rather than on
+            # the end-of-history totals, which belong to a later point in time.
+            last_sums = {
+                kind: await async_get_last_sum_before(
+                    self.hass, build_statistic_id(delivery_site_id, kind), range_start
+                )
+                or 0.0
+                for kind in kinds
+            }
+        else:
+            last_sums = self._stored_sums()
 
-        try:
-            await insert_statistics(
+        with run.stage(STAGE_BUILD_STATISTICS):
+            statistics, last_values = build_statistics(
                 self.hass,
-                consumption_stats,
-                cost_stats,
-                force_overwrite=force_overwrite,
+                delivery_site_id,
+                columns,
+                kinds=kinds,
+                last_sums=last_sums,
             )
+        del columns
+        run.rows += sum(len(rows) for _, rows in statistics.values())
+
+        try:
+            with run.stage(STAGE_INSERT):
+                deltas = await insert_statistics(
+                    self.hass,
+                    statistics,
+                    force_overwrite=force_overwrite,
+                    end=range_end,
+                )
         except ConfigEntryAuthFailed:
             raise
         except Exception as exc:
             raise UpdateFailed("Failed to write statistics") from exc
 
-        await self._async_persist_progress(
-            last_imported_date=end,
-            last_sum_kwh=last_values.last_sum_kwh,
-            last_sum_cost=last_values.last_sum_cost,
-        )
+        if learned is not None:
+            # Only after the write succeeded, so a retried window is not learned twice.
+            slots, consumption, check = learned
+            self._state.state.baseline.update(slots, consumption)
+            if check is not None:
+                self._state.state.consumption_check = check
+
+        if force_overwrite:
+            self._persist_refresh(end, last_values.sums, deltas)
+        else:
+            self._persist_progress(
+                last_imported_date=end,
+                sums=last_values.sums,
+                backfill_complete=backfill_complete,
+            )
 
         return CoordinatorData(
             last_imported_date=end,
@@ -157,52 +925,112 @@ class OmaHelenCoordinator(DataUpdateCoordinator[CoordinatorData]):
             last_spot_price_eur_per_kwh=last_values.last_spot_price_eur_per_kwh,
         )
 
-    async def _async_persist_progress(
-        self, last_imported_date: date, last_sum_kwh: float, last_sum_cost: float
-    ) -> None:
-        new_data = dict(self.entry.data)
-        new_data[CONF_LAST_FETCHED_DATE] = last_imported_date.isoformat()
-        new_data[CONF_INITIAL_BACKFILL_DONE] = True
-        new_data[CONF_LAST_SUM_KWH] = last_sum_kwh
-        new_data[CONF_LAST_SUM_COST] = last_sum_cost
-        self.hass.config_entries.async_update_entry(self.entry, data=new_data)
-
-
-def _parse_ts(value: str) -> datetime:
-    ts = value.rstrip()
-    if ts.endswith("Z"):
-        ts = f"{ts[:-1]}+00:00"
-    parsed = datetime.fromisoformat(ts)
-    if parsed.tzinfo is None:
-        parsed = parsed.replace(tzinfo=dt_util.UTC)
-    return dt_util.as_utc(parsed)
-
-
-def _response_to_points(response) -> list[ConsumptionAndCostPoint]:
-    points: list[ConsumptionAndCostPoint] = []
-    for s in getattr(response, "series", []) or []:
-        if s.electricity is None:
-            continue
-        start = _parse_ts(s.start)
-        consumption_kwh = abs(float(s.electricity))
-        spot_c_per_kwh = None
-        if s.electricity_spot_prices_vat is not None:
-            spot_c_per_kwh = float(s.electricity_spot_prices_vat)
-        elif s.electricity_spot_prices is not None:
-            spot_c_per_kwh = float(s.electricity_spot_prices)
-
-        points.append(
-            ConsumptionAndCostPoint(
-                start=start,
-                consumption_kwh=consumption_kwh,
-                spot_price_c_per_kwh=spot_c_per_kwh,
+    def _compare_with_baseline(
+        self, columns: PointColumns
+    ) -> tuple[array, ConsumptionCheck | None]:
+        # Fills in expected consumption and checks the most recent intervals
+        # against the baseline as it was before they arrived.
+        baseline = self._state.state.baseline
+        slots = baseline.slots(columns.starts)
+        columns.expected_consumption_kwh = baseline.expected(slots)
+        recent = slice(-ANOMALY_CHECK_INTERVALS, None)
+        check = baseline.check(
+            slots[recent], columns.starts[recent], columns.consumption_kwh[recent]
+        )
+        return slots, check
+
+    def _note_production(self, columns: PointColumns) -> None:
+        # Sites without panels never get production statistics; the first fed-in
+        # interval switches them on for good.
+        state = self._state.state
+        if not state.has_production and any(columns.production_kwh or ()):
+            state.has_production = True
+            self._state.async_schedule_save()
+
+    def _stored_sums(self) -> dict[str, float]:
+        sums = self._state.state.sums
+        return {kind: sums.get(kind, 0.0) for kind in STATISTIC_KINDS}
+
+    def _persist_refresh(self, end: date, sums: dict[str, float], deltas: dict[str, float]) -> None:
+        state = self._state.state
+        last_fetched = state.last_imported_day
+
+        if last_fetched is not None and end < last_fetched:
+            # Everything imported after the refreshed range was shifted by the deltas.
+            stored = self._stored_sums()
+            self._persist_progress(
+                last_imported_date=last_fetched,
+                sums={kind: stored[kind] + delta for kind, delta in deltas.items()},
+                backfill_complete=False,
             )
+        elif state.initial_backfill_done:
+            self._persist_progress(last_imported_date=end, sums=sums)
+
+    def _persist_progress(
+        self,
+        last_imported_date: date,
+        sums: dict[str, float],
+        backfill_complete: bool = True,
+    ) -> None:
+        state = self._state.state
+        state.last_imported_until = dt_util.as_utc(
+            local_day_range(last_imported_date, last_imported_date)[1]
         )
-    points.sort(key=lambda p: p.start)
-    return points
+        if (
+            state.provisional_until is not None
+            and state.provisional_until <= state.last_imported_until
+        ):
+            state.provisional_until = None
+        state.initial_backfill_done = state.initial_backfill_done or backfill_complete
+        state.sums.update(sums)
+        self._state.async_schedule_save()
+
+
+@contextmanager
+def _parse_errors(title: str) -> Iterator[None]:
+    # Responses are parsed while they are ingested, after the API call returned,
+    # so a malformed body or entry has to be turned into a failed update here.
+    try:
+        yield
+    except (api.OmaHelenApiError, KeyError, TypeError, ValueError) as exc:
+        raise UpdateFailed(f"{title}: malformed measurements from Helen: {exc}") from exc
 
 
-def _resolution_quarter() -> str:
-    from helenservice.const import RESOLUTION_QUARTER
+def _log_retry(exc: Exception, delay: float) -> None:
+    _LOGGER.debug("Retrying Oma Helen request in %.1f s after: %s", delay, exc)
+
+
+def _merge_gaps(
+    gaps: Iterable[tuple[float, float]], max_distance: float
+) -> list[tuple[float, float]]:
+    # Gaps close to each other are asked for in one request; the intervals in
+    # between come along and are ignored where the cache already has them.
+    merged: list[tuple[float, float]] = []
+    for start, end in sorted(gaps):
+        if merged and start - merged[-1][1] <= max_distance:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _day_runs(days: list[date]) -> Iterator[tuple[date, date]]:
+    # Consecutive days as (first, last) ranges.
+    run_start = previous = None
+    for day in days:
+        if previous is not None and day == previous + timedelta(days=1):
+            previous = day
+            continue
+        if run_start is not None:
+            yield run_start, previous
+        run_start = previous = day
+    if run_start is not None:
+        yield run_start, previous
+
 
-    return RESOLUTION_QUARTER
+def _iter_windows(start: date, end: date, days: int) -> Iterator[tuple[date, date]]:
+    window_start = start
+    while window_start <= end:
+        window_end = min(window_start + timedelta(days=days - 1), end)
+        yield window_start, window_end
+        window_start = window_end + timedelta(days=1)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass
+from operator import mul
+from typing import Any
+
+from .const import (
+    CONF_ENERGY_MARGIN_C_PER_KWH,
+    CONF_FEED_IN_MARGIN_C_PER_KWH,
+    CONF_TRANSFER_BASE_EUR_PER_MONTH,
+    CONF_TRANSFER_FEE_C_PER_KWH,
+    CONF_VAT_RATE,
+    DEFAULT_VAT_RATE,
+)
+from .statistics import PointColumns
+from .timeutil import local_month_bounds
+
+
+@dataclass(frozen=True, slots=True)
+class Tariff:
+    # Margin and transfer prices are entered without VAT; spot prices include it
+    # once include_spot_vat has run.
+    vat_rate: float
+    energy_margin_c_per_kwh: float
+    transfer_fee_c_per_kwh: float
+    transfer_base_eur_per_month: float
+    # Deducted from the spot price without VAT for produced energy.
+    feed_in_margin_c_per_kwh: float = 0.0
+
+    @classmethod
+    def from_options(cls, options: Mapping[str, Any]) -> Tariff:
+        return cls(
+            vat_rate=float(options.get(CONF_VAT_RATE, DEFAULT_VAT_RATE)),
+            energy_margin_c_per_kwh=float(options.get(CONF_ENERGY_MARGIN_C_PER_KWH, 0.0)),
+            transfer_fee_c_per_kwh=float(options.get(CONF_TRANSFER_FEE_C_PER_KWH, 0.0)),
+            transfer_base_eur_per_month=float(options.get(CONF_TRANSFER_BASE_EUR_PER_MONTH, 0.0)),
+            feed_in_margin_c_per_kwh=float(options.get(CONF_FEED_IN_MARGIN_C_PER_KWH, 0.0)),
+        )
+
+    @property
+    def has_transfer(self) -> bool:
+        return bool(self.transfer_fee_c_per_kwh or self.transfer_base_eur_per_month)
+
+
+def include_spot_vat(columns: PointColumns, vat_rate: float) -> None:
+    # Helen's spot price normally includes VAT; add it to the prices that came
+    # without, so every price below is taxed exactly once.
+    excludes_vat = columns.spot_excludes_vat
+    columns.spot_excludes_vat = None
+    if excludes_vat is None or not any(excludes_vat):
+        return
+    vat = 1.0 + vat_rate / 100.0
+    columns.spot_price_c_per_kwh = array(
+        "d",
+        (
+            spot * vat if excluded else spot
+            for spot, excluded in zip(columns.spot_price_c_per_kwh, excludes_vat)
+        ),
+    )
+
+
+def apply_tariff(columns: PointColumns, tariff: Tariff, interval_seconds: float) -> None:
+    include_spot_vat(columns, tariff.vat_rate)
+    vat = 1.0 + tariff.vat_rate / 100.0
+    margin_c_per_kwh = tariff.energy_margin_c_per_kwh * vat
+
+    # A missing spot price stays NaN through the whole column and yields no row.
+    energy_eur_per_kwh = ((spot + margin_c_per_kwh) / 100.0 for spot in columns.spot_price_c_per_kwh)
+    columns.energy_cost_eur = array("d", map(mul, columns.consumption_kwh, energy_eur_per_kwh))
+
+    if columns.production_kwh is not None:
+        # Sold energy is paid at the spot price without VAT, less the seller's margin.
+        feed_in_eur_per_kwh = (
+            (spot / vat - tariff.feed_in_margin_c_per_kwh) / 100.0
+            for spot in columns.spot_price_c_per_kwh
+        )
+        columns.feed_in_revenue_eur = array(
+            "d", map(mul, columns.production_kwh, feed_in_eur_per_kwh)
+        )
+
+    if not tariff.has_transfer:
+        columns.transfer_cost_eur = None
+        return
+
+    fee_eur_per_kwh = tariff.transfer_fee_c_per_kwh * vat / 100.0
+    base_shares = _base_fee_shares(
+        columns.starts, tariff.transfer_base_eur_per_month * vat, interval_seconds
+    )
+    columns.transfer_cost_eur = array(
+        "d",
+        (kwh * fee_eur_per_kwh + share for kwh, share in zip(columns.consumption_kwh, base_shares)),
+    )
+
+
+def _base_fee_shares(starts: array, base_eur_per_month: float, interval_seconds: float) -> Iterator[float]:
+    # Pro-rate the monthly base fee by the length of the local month each interval
+    # falls in; month bounds are only recomputed when an interval leaves them.
+    month_start = month_end = 0.0
+    share = 0.0
+    for start in starts:
+        if not month_start <= start < month_end:
+            month_start, month_end = local_month_bounds(start)
+            share = base_eur_per_month * interval_seconds / (month_end - month_start)
+        yield share
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from . import api
+from .const import CONF_ACCESS_TOKEN, DATA_COORDINATOR, DOMAIN
+from .coordinator import OmaHelenCoordinator
+
+TO_REDACT = {CONF_ACCESS_TOKEN, CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    coordinator: OmaHelenCoordinator = hass.data[DOMAIN][entry.entry_id][DATA_COORDINATOR]
+    prices = coordinator.prices
+    token_expires = api.token_expiry(entry.data[CONF_ACCESS_TOKEN])
+    import_state = coordinator.import_state.as_dict()
+    # The full baseline is hundreds of numbers; how far it has come is enough here.
+    import_state["baseline"] = {"ready_slots": coordinator.import_state.baseline.ready_slots}
+    gap_counts = coordinator.gap_counts
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "import_state": import_state,
+        "account": {
+            "sites": len(coordinator.account.sites),
+            "update_interval": str(coordinator.account.update_interval),
+            "last_update_success": coordinator.account.last_update_success,
+            "token_expires": None if token_expires is None else token_expires.isoformat(),
+            "password_stored": CONF_PASSWORD in entry.data,
+        },
+        "spot_prices": {
+            "intervals": len(prices),
+            "until": None if prices.end is None else dt_util.utc_from_timestamp(prices.end).isoformat(),
+        },
+        "gaps": {
+            "days": len(gap_counts),
+            "missing_intervals": sum(gap_counts.values()),
+            "by_day": {day.isoformat(): count for day, count in gap_counts.items()},
+        },
+        "runs": coordinator.metrics.as_list(),
+        "export_runs": coordinator.export_metrics.as_list(),
+    }
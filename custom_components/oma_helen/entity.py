@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import CONF_DELIVERY_SITE_ID, DOMAIN
+from .coordinator import OmaHelenCoordinator
+
+
+class OmaHelenEntity(CoordinatorEntity[OmaHelenCoordinator]):
+    # Every entity of a config entry belongs to the device of its delivery site.
+    _attr_has_entity_name = True
+
+    def __init__(self, coordinator: OmaHelenCoordinator, entry: ConfigEntry) -> None:
+        super().__init__(coordinator)
+        self._entry = entry
+        self._delivery_site_id = str(entry.data[CONF_DELIVERY_SITE_ID])
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        return DeviceInfo(
+            identifiers={(DOMAIN, self._delivery_site_id)},
+            name=f"Oma Helen {self._delivery_site_id}",
+            manufacturer="Helen",
+        )
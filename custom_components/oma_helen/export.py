@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import csv
+from datetime import datetime, timezone
+import gzip
+import math
+import os
+from pathlib import Path
+from typing import IO
+
+from .statistics import PointColumns
+
+EXPORT_FIELDS = (
+    "start",
+    "consumption_kwh",
+    "spot_price_c_per_kwh",
+    "energy_cost_eur",
+    "transfer_cost_eur",
+    "production_kwh",
+    "feed_in_revenue_eur",
+)
+
+
+class CsvExportWriter:
+    """Gzipped CSV of quarter-hour columns, written one chunk at a time.
+
+    Rows go to a temporary file next to the target, which only replaces the
+    target once the export is complete. All methods block and are meant to run
+    in the executor.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.rows = 0
+        self._partial = path.with_name(f"{path.name}.partial")
+        self._file: IO[str] | None = None
+        self._writer = None
+
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self._partial, "wt", encoding="ascii", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(EXPORT_FIELDS)
+
+    def write(self, columns: PointColumns) -> None:
+        missing = (math.nan,) * len(columns)
+        self._writer.writerows(
+            (
+                datetime.fromtimestamp(start, timezone.utc).isoformat(),
+                _format(consumption),
+                _format(spot),
+                _format(energy),
+                _format(transfer),
+                _format(production),
+                _format(feed_in),
+            )
+            for start, consumption, spot, energy, transfer, production, feed_in in zip(
+                columns.starts,
+                columns.consumption_kwh,
+                columns.spot_price_c_per_kwh,
+                columns.energy_cost_eur or missing,
+                columns.transfer_cost_eur or missing,
+                columns.production_kwh or missing,
+                columns.feed_in_revenue_eur or missing,
+            )
+        )
+        self.rows += len(columns)
+
+    def close(self) -> None:
+        self._file.close()
+        os.replace(self._partial, self.path)
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._partial.unlink(missing_ok=True)
+
+
+def _format(value: float) -> str:
+    # Missing values are left empty rather than written as "nan".
+    return "" if math.isnan(value) else repr(value)
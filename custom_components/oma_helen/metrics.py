@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+import time
+from typing import Any
+
+from homeassistant.util import dt as dt_util
+
+from .const import METRICS_HISTORY_SIZE
+
+STAGE_CLIENT = "client"
+STAGE_FETCH = "fetch"
+STAGE_PARSE = "parse"
+STAGE_AGGREGATE = "aggregate"
+STAGE_BUILD_STATISTICS = "build_statistics"
+STAGE_INSERT = "insert"
+
+STAGES = (
+    STAGE_CLIENT,
+    STAGE_FETCH,
+    STAGE_PARSE,
+    STAGE_AGGREGATE,
+    STAGE_BUILD_STATISTICS,
+    STAGE_INSERT,
+)
+
+
+@dataclass(slots=True)
+class RunMetrics:
+    # Fetch windows run concurrently, so stage durations are summed over the
+    # windows and can add up to more than the wall-clock duration of the run.
+    kind: str
+    started: datetime = field(default_factory=dt_util.utcnow)
+    durations: dict[str, float] = field(default_factory=lambda: dict.fromkeys(STAGES, 0.0))
+    requests: int = 0
+    retries: int = 0
+    bytes_received: int = 0
+    points: int = 0
+    rows: int = 0
+    duration: float = 0.0
+    error: str | None = None
+    _started_monotonic: float = field(default_factory=time.perf_counter, init=False, repr=False)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] += time.perf_counter() - started
+
+    def finish(self, error: BaseException | None = None) -> None:
+        self.duration = time.perf_counter() - self._started_monotonic
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "started": self.started.isoformat(),
+            "duration": round(self.duration, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in self.durations.items()},
+            "requests": self.requests,
+            "retries": self.retries,
+            "bytes_received": self.bytes_received,
+            "points": self.points,
+            "rows": self.rows,
+            "error": self.error,
+        }
+
+
+class MetricsHistory:
+    """The most recent import runs of one delivery site, newest last."""
+
+    def __init__(self, size: int = METRICS_HISTORY_SIZE) -> None:
+        self._runs: deque[RunMetrics] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    @property
+    def last(self) -> RunMetrics | None:
+        return self._runs[-1] if self._runs else None
+
+    @property
+    def mean_duration(self) -> float | None:
+        if not self._runs:
+            return None
+        return sum(run.duration for run in self._runs) / len(self._runs)
+
+    def record(self, run: RunMetrics) -> None:
+        self._runs.append(run)
+
+    def as_list(self) -> list[dict[str, Any]]:
+        return [run.as_dict() for run in self._runs]
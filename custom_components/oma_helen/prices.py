@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator, Sequence
+from heapq import nsmallest
+from itertools import accumulate
+import math
+from operator import mul
+from typing import Any
+
+from .api import parse_timestamp, spot_price
+from .const import DEFAULT_VAT_RATE, INTERVAL_SECONDS
+
+
+class SpotPriceIndex:
+    # Time-sorted spot prices (c/kWh, VAT included) for today and tomorrow, with a
+    # sorted copy for percentile ranks and prefix sums for window averages. It is
+    # rebuilt when prices are fetched, and only read afterwards.
+    __slots__ = ("starts", "prices", "interval_seconds", "_sorted_prices", "_prefix", "_windows")
+
+    def __init__(self, starts: array, prices: array, interval_seconds: int = INTERVAL_SECONDS) -> None:
+        self.starts = starts
+        self.prices = prices
+        self.interval_seconds = interval_seconds
+        self._sorted_prices = array("d", sorted(prices))
+        self._prefix = array("d", accumulate(prices, initial=0.0))
+        self._windows: dict[tuple[int, int], tuple[float, float] | None] = {}
+
+    @classmethod
+    def from_series(
+        cls,
+        series: Iterable[dict[str, Any]],
+        not_before: float,
+        interval_seconds: int = INTERVAL_SECONDS,
+        vat_rate: float = DEFAULT_VAT_RATE,
+    ) -> SpotPriceIndex:
+        # Indexed prices include VAT; the rate is added to any sent without it.
+        vat = 1.0 + vat_rate / 100.0
+        rows: dict[float, float] = {}
+        for entry in series:
+            spot = spot_price(entry)
+            if spot is None:
+                continue
+            start_ts = parse_timestamp(entry["start"]).timestamp()
+            if start_ts >= not_before:
+                price, includes_vat = spot
+                rows[start_ts] = price if includes_vat else price * vat
+        starts = sorted(rows)
+        return cls(array("d", starts), array("d", map(rows.__getitem__, starts)), interval_seconds)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def end(self) -> float | None:
+        return self.starts[-1] + self.interval_seconds if self.starts else None
+
+    def price_at(self, ts: float) -> float | None:
+        idx = bisect_right(self.starts, ts) - 1
+        if idx < 0 or ts >= self.starts[idx] + self.interval_seconds:
+            return None
+        return self.prices[idx]
+
+    def percentile_rank(self, price: float) -> float | None:
+        # Share of indexed intervals that are strictly cheaper, in percent.
+        if not self._sorted_prices:
+            return None
+        return 100.0 * bisect_left(self._sorted_prices, price) / len(self._sorted_prices)
+
+    def mean_between(self, first: int, last: int) -> float:
+        return (self._prefix[last] - self._prefix[first]) / (last - first)
+
+    def cheapest_window(
+        self,
+        duration_seconds: float,
+        not_before: float | None = None,
+        not_after: float | None = None,
+    ) -> tuple[float, float] | None:
+        """Return the start and mean price of the cheapest contiguous window."""
+        count = math.ceil(duration_seconds / self.interval_seconds)
+        first, stop = self._slot_range(not_before, not_after)
+        # The index never changes, so callers polling every minute hit the memo.
+        key = (count, first, stop)
+        if key in self._windows:
+            return self._windows[key]
+        best: tuple[float, float] | None = None
+        for idx in self._window_starts(count, first, stop):
+            mean = self.mean_between(idx, idx + count)
+            if best is None or mean < best[1]:
+                best = (self.starts[idx], mean)
+        self._windows[key] = best
+        return best
+
+    def cheapest_profile_window(
+        self,
+        profile: Sequence[float],
+        not_before: float | None = None,
+        not_after: float | None = None,
+    ) -> tuple[float, float] | None:
+        """Return the start and weighted price sum of the cheapest window for a load profile."""
+        first, stop = self._slot_range(not_before, not_after)
+        prices = self.prices
+        best: tuple[float, float] | None = None
+        for idx in self._window_starts(len(profile), first, stop):
+            total = math.fsum(map(mul, profile, prices[idx : idx + len(profile)]))
+            if best is None or total < best[1]:
+                best = (self.starts[idx], total)
+        return best
+
+    def cheapest_slots(
+        self,
+        count: int,
+        not_before: float | None = None,
+        not_after: float | None = None,
+    ) -> list[int] | None:
+        """Return the indices of the cheapest intervals in time order."""
+        first, stop = self._slot_range(not_before, not_after)
+        if stop - first < count:
+            return None
+        return sorted(nsmallest(count, range(first, stop), key=self.prices.__getitem__))
+
+    def _slot_range(self, not_before: float | None, not_after: float | None) -> tuple[int, int]:
+        # Intervals that start at or after not_before and end by not_after.
+        first = 0 if not_before is None else bisect_left(self.starts, not_before)
+        if not_after is None:
+            return first, len(self.starts)
+        return first, max(first, bisect_right(self.starts, not_after - self.interval_seconds))
+
+    def _window_starts(self, count: int, first: int, stop: int) -> Iterator[int]:
+        span = (count - 1) * self.interval_seconds
+        for idx in range(first, stop - count + 1):
+            if self.starts[idx + count - 1] - self.starts[idx] == span:
+                yield idx
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import random
+from typing import TypeVar
+
+from .api import OmaHelenApiError
+from .const import RETRY_AFTER_MAX_SECONDS, RETRY_ATTEMPTS, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS
+
+_T = TypeVar("_T")
+
+
+def retry_delay(exc: Exception, attempt: int) -> float | None:
+    """Return the delay before retrying a failed attempt, or None to give up."""
+    # Authentication and permanent API errors are never retried. A Retry-After
+    # longer than RETRY_AFTER_MAX_SECONDS is left to the next poll rather than
+    # holding a fetch slot that long.
+    if not isinstance(exc, OmaHelenApiError) or not exc.transient:
+        return None
+    if attempt + 1 >= RETRY_ATTEMPTS:
+        return None
+    if exc.retry_after is not None:
+        if exc.retry_after > RETRY_AFTER_MAX_SECONDS:
+            return None
+        return exc.retry_after + RETRY_BASE_SECONDS * random.random()
+    ceiling = min(RETRY_BASE_SECONDS * (2**attempt), RETRY_MAX_SECONDS)
+    return ceiling / 2 + ceiling / 2 * random.random()
+
+
+async def async_retry(
+    call: Callable[[], Awaitable[_T]],
+    on_retry: Callable[[Exception, float], None] | None = None,
+) -> _T:
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except OmaHelenApiError as exc:
+            delay = retry_delay(exc, attempt)
+            if delay is None:
+                raise
+            if on_retry is not None:
+                on_retry(exc, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from collections import deque
+from datetime import date, datetime, timedelta
+import logging
+import random
+from statistics import median
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, SCHEDULE_SAVE_DELAY, SCHEDULE_STORAGE_VERSION
+from .timeutil import HELEN_TIME_ZONE, local_midnight
+
+_LOGGER = logging.getLogger(__name__)
+
+EVENT_CONSUMPTION = "consumption"
+EVENT_SPOT_PRICES = "spot_prices"
+
+# Minutes after local midnight, used until a publication has been observed.
+_DEFAULT_MINUTES = {EVENT_CONSUMPTION: 8 * 60, EVENT_SPOT_PRICES: 14 * 60}
+_MAX_OBSERVATIONS = 14
+_LEAD = timedelta(minutes=30)
+_IDLE_JITTER = timedelta(minutes=10)
+_BACKOFF_BASE = timedelta(minutes=10)
+_BACKOFF_MAX = timedelta(hours=2)
+_MIN_INTERVAL = timedelta(minutes=1)
+
+
+class PublicationSchedule:
+    """Learns when Helen publishes data and derives the next poll interval.
+
+    Publication times are kept as minutes after Helsinki midnight. They are the
+    same for every account, so one schedule is shared by all config entries.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store: Store[dict[str, Any]] = Store(
+            hass, SCHEDULE_STORAGE_VERSION, f"{DOMAIN}.schedule"
+        )
+        self._observations: dict[str, deque[int]] = {}
+        self._missed_on: dict[str, date] = {}
+        self._probed_on: dict[str, date] = {}
+        self._loaded = False
+
+    async def async_load(self) -> None:
+        if self._loaded:
+            return
+        stored = await self._store.async_load() or {}
+        for event, minutes in stored.get("observations", {}).items():
+            self._observations[event] = deque(minutes, maxlen=_MAX_OBSERVATIONS)
+        self._loaded = True
+
+    def expected_minute(self, event: str) -> int:
+        observations = self._observations.get(event)
+        if not observations:
+            return _DEFAULT_MINUTES[event]
+        return int(median(observations))
+
+    def observe(self, event: str, published: bool, now: datetime) -> None:
+        local = now.astimezone(HELEN_TIME_ZONE)
+        minute = local.hour * 60 + local.minute
+        first_probe = self._probed_on.get(event) != local.date()
+        self._probed_on[event] = local.date()
+        if not published:
+            self._missed_on[event] = local.date()
+            return
+
+        if self._missed_on.pop(event, None) == local.date():
+            # Missing earlier today and present now: it appeared since the last probe.
+            self._record(event, minute)
+        elif (
+            first_probe
+            and abs(minute - self.expected_minute(event)) <= _LEAD.total_seconds() // 60
+        ):
+            # Already there at the day's first probe, so the estimate is late;
+            # move it earlier by one lead period. Later probes that day say
+            # nothing about when it appeared.
+            self._record(event, max(0, minute - int(_LEAD.total_seconds() // 60)))
+
+    def next_interval(self, event: str, published: bool, attempt: int, now: datetime) -> timedelta:
+        local = now.astimezone(HELEN_TIME_ZONE)
+        expected = local_midnight(local.date()) + timedelta(minutes=self.expected_minute(event))
+        if published:
+            # Sleep until shortly before the next expected publication.
+            delay = expected + timedelta(days=1) - _LEAD - local
+            delay += _IDLE_JITTER * random.random()
+        elif local < expected - _LEAD:
+            delay = expected - _LEAD - local
+            delay += _IDLE_JITTER * random.random()
+        else:
+            # Poll densely around the expected time, backing off with full jitter.
+            ceiling = min(_BACKOFF_BASE * (2**attempt), _BACKOFF_MAX)
+            delay = ceiling / 2 + ceiling / 2 * random.random()
+        return max(delay, _MIN_INTERVAL)
+
+    def _record(self, event: str, minute: int) -> None:
+        observations = self._observations.setdefault(event, deque(maxlen=_MAX_OBSERVATIONS))
+        observations.append(minute)
+        _LOGGER.debug(
+            "Observed %s publication at minute %d, now expecting minute %d",
+            event,
+            minute,
+            self.expected_minute(event),
+        )
+        self._store.async_delay_save(self._data_to_save, SCHEDULE_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict[str, Any]:
+        return {
+            "observations": {event: list(minutes) for event, minutes in self._observations.items()}
+        }
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
-from homeassistant.components.sensor import SensorDeviceClass, SensorEntity
+from datetime import datetime
+
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.helpers.event import async_track_time_change
+from homeassistant.util import dt as dt_util
 
-from .const import CONF_DELIVERY_SITE_ID, DATA_COORDINATOR, DOMAIN
+from .const import DATA_COORDINATOR, DOMAIN
 from .coordinator import OmaHelenCoordinator
+from .entity import OmaHelenEntity
 
 
 async def async_setup_entry(
@@ -19,28 +23,15 @@ async def async_setup_entry(
         [
             OmaHelenLastImportSensor(coordinator, entry),
             OmaHelenSpotPriceSensor(coordinator, entry),
+            OmaHelenCurrentSpotPriceSensor(coordinator, entry),
+            OmaHelenImportDurationSensor(coordinator, entry),
+            OmaHelenImportDataSensor(coordinator, entry),
         ]
     )
 
 
-class _BaseOmaHelenSensor(CoordinatorEntity[OmaHelenCoordinator], SensorEntity):
-    def __init__(self, coordinator: OmaHelenCoordinator, entry: ConfigEntry) -> None:
-        super().__init__(coordinator)
-        self._entry = entry
-        self._delivery_site_id = str(entry.data[CONF_DELIVERY_SITE_ID])
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        return DeviceInfo(
-            identifiers={(DOMAIN, self._delivery_site_id)},
-            name=f"Oma Helen {self._delivery_site_id}",
-            manufacturer="Helen",
-        )
-
-
-class OmaHelenLastImportSensor(_BaseOmaHelenSensor):
+class OmaHelenLastImportSensor(OmaHelenEntity, SensorEntity):
     _attr_icon = "mdi:calendar-check"
-    _attr_has_entity_name = True
     _attr_name = "Last import date"
     _attr_device_class = SensorDeviceClass.DATE
 
@@ -55,10 +46,15 @@ class OmaHelenLastImportSensor(_BaseOmaHelenSensor):
         imported = self.coordinator.data.last_imported_date
         return imported
 
+    @property
+    def extra_state_attributes(self) -> dict[str, str] | None:
+        if self.coordinator.data is None or self.coordinator.data.provisional_until is None:
+            return None
+        return {"provisional_until": self.coordinator.data.provisional_until.isoformat()}
 
-class OmaHelenSpotPriceSensor(_BaseOmaHelenSensor):
+
+class OmaHelenSpotPriceSensor(OmaHelenEntity, SensorEntity):
     _attr_icon = "mdi:currency-eur"
-    _attr_has_entity_name = True
     _attr_name = "Last spot price"
 
     def __init__(self, coordinator: OmaHelenCoordinator, entry: ConfigEntry) -> None:
@@ -74,3 +70,102 @@ class OmaHelenSpotPriceSensor(_BaseOmaHelenSensor):
         if self.coordinator.data is None:
             return None
         return self.coordinator.data.last_spot_price_eur_per_kwh
+
+
+class OmaHelenCurrentSpotPriceSensor(OmaHelenEntity, SensorEntity):
+    _attr_icon = "mdi:cash-clock"
+    _attr_name = "Spot price"
+
+    def __init__(self, coordinator: OmaHelenCoordinator, entry: ConfigEntry) -> None:
+        super().__init__(coordinator, entry)
+        self._attr_unique_id = f"{self._delivery_site_id}_spot_price"
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # Prices change every quarter-hour; the index answers from memory.
+        self.async_on_remove(
+            async_track_time_change(
+                self.hass, self._async_quarter_changed, minute=(0, 15, 30, 45), second=0
+            )
+        )
+
+    @callback
+    def _async_quarter_changed(self, now: datetime) -> None:
+        self.async_write_ha_state()
+
+    @property
+    def native_unit_of_measurement(self) -> str | None:
+        return "EUR/kWh"
+
+    @property
+    def native_value(self):
+        price = self.coordinator.prices.price_at(dt_util.utcnow().timestamp())
+        return None if price is None else price / 100.0
+
+    @property
+    def extra_state_attributes(self) -> dict[str, object] | None:
+        prices = self.coordinator.prices
+        now = dt_util.utcnow().timestamp()
+        price = prices.price_at(now)
+        if price is None:
+            return None
+        attributes: dict[str, object] = {
+            "percentile": round(prices.percentile_rank(price), 1),
+            "prices_until": dt_util.utc_from_timestamp(prices.end).isoformat(),
+        }
+        cheapest = prices.cheapest_window(3600, not_before=now - now % prices.interval_seconds)
+        if cheapest is not None:
+            attributes["cheapest_hour_start"] = dt_util.utc_from_timestamp(cheapest[0]).isoformat()
+            attributes["cheapest_hour_price"] = round(cheapest[1] / 100.0, 5)
+        return attributes
+
+
+class _BaseImportMetricsSensor(OmaHelenEntity, SensorEntity):
+    # Debug aid for slow imports; enable from the device page when needed.
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+
+class OmaHelenImportDurationSensor(_BaseImportMetricsSensor):
+    _attr_icon = "mdi:timer-outline"
+    _attr_name = "Last import duration"
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.SECONDS
+    _attr_suggested_display_precision = 2
+
+    def __init__(self, coordinator: OmaHelenCoordinator, entry: ConfigEntry) -> None:
+        super().__init__(coordinator, entry)
+        self._attr_unique_id = f"{self._delivery_site_id}_last_import_duration"
+
+    @property
+    def native_value(self):
+        run = self.coordinator.metrics.last
+        return None if run is None else round(run.duration, 3)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, object] | None:
+        metrics = self.coordinator.metrics
+        run = metrics.last
+        if run is None:
+            return None
+        attributes = run.as_dict()
+        attributes["recent_runs"] = len(metrics)
+        attributes["recent_mean_duration"] = round(metrics.mean_duration, 3)
+        return attributes
+
+
+class OmaHelenImportDataSensor(_BaseImportMetricsSensor):
+    _attr_icon = "mdi:download-network-outline"
+    _attr_name = "Last import data received"
+    _attr_device_class = SensorDeviceClass.DATA_SIZE
+    _attr_native_unit_of_measurement = UnitOfInformation.BYTES
+
+    def __init__(self, coordinator: OmaHelenCoordinator, entry: ConfigEntry) -> None:
+        super().__init__(coordinator, entry)
+        self._attr_unique_id = f"{self._delivery_site_id}_last_import_data_received"
+
+    @property
+    def native_value(self):
+        run = self.coordinator.metrics.last
+        return None if run is None else run.bytes_received
@@ -1,19 +1,39 @@
 from __future__ import annotations
 
+import asyncio
+from contextlib import aclosing
 from datetime import date
 import logging
+import math
+from pathlib import Path
+from typing import Any
 
 import voluptuous as vol
 
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
 
 from .const import (
+    ATTR_CONTIGUOUS,
+    ATTR_DEADLINE,
+    ATTR_DURATION,
+    ATTR_EARLIEST_START,
     ATTR_END_DATE,
+    ATTR_LOAD_PROFILE,
     ATTR_START_DATE,
-    DATA_COORDINATOR,
+    CONF_DELIVERY_SITE_ID,
+    DATA_ACCOUNTS,
     DOMAIN,
+    EXPORT_DIRECTORY,
+    SERVICE_EXPORT,
+    SERVICE_FIND_CHEAPEST_WINDOW,
     SERVICE_REFRESH_STATISTICS,
 )
+from .coordinator import OmaHelenCoordinator
+from .export import CsvExportWriter
+from .prices import SpotPriceIndex
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -31,10 +51,15 @@ async def async_setup_services(hass: HomeAssistant) -> None:
         if end < start:
             raise vol.Invalid("end_date must be on or after start_date")
 
-        entries = hass.config_entries.async_entries(DOMAIN)
-        for entry in entries:
-            coordinator = hass.data[DOMAIN][entry.entry_id][DATA_COORDINATOR]
-            await coordinator.async_refresh_range(start, end)
+        # Each account refreshes its delivery sites concurrently over one client.
+        accounts = list(hass.data[DOMAIN].get(DATA_ACCOUNTS, {}).values())
+        results = await asyncio.gather(
+            *(account.async_refresh_range(start, end) for account in accounts),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
 
     hass.services.async_register(
         DOMAIN,
@@ -47,9 +72,161 @@ async def async_setup_services(hass: HomeAssistant) -> None:
             }
         ),
     )
+
+    async def _handle_find_cheapest_window(call: ServiceCall) -> ServiceResponse:
+        return _find_cheapest_window(hass, call.data)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_FIND_CHEAPEST_WINDOW,
+        _handle_find_cheapest_window,
+        schema=vol.Schema(
+            {
+                vol.Required(ATTR_DURATION): cv.positive_time_period,
+                vol.Optional(ATTR_EARLIEST_START): cv.datetime,
+                vol.Optional(ATTR_DEADLINE): cv.datetime,
+                vol.Optional(ATTR_LOAD_PROFILE): vol.All(
+                    cv.ensure_list, [vol.All(vol.Coerce(float), vol.Range(min=0))]
+                ),
+                vol.Optional(ATTR_CONTIGUOUS, default=True): cv.boolean,
+                vol.Optional(CONF_DELIVERY_SITE_ID): cv.string,
+            }
+        ),
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def _handle_export(call: ServiceCall) -> ServiceResponse:
+        start = date.fromisoformat(call.data[ATTR_START_DATE])
+        end = date.fromisoformat(call.data[ATTR_END_DATE])
+        if end < start:
+            raise vol.Invalid("end_date must be on or after start_date")
+        delivery_site_id = call.data.get(CONF_DELIVERY_SITE_ID)
+        sites = [
+            site
+            for account in hass.data[DOMAIN].get(DATA_ACCOUNTS, {}).values()
+            for site in account.sites
+            if delivery_site_id in (None, site.delivery_site_id)
+        ]
+        if not sites:
+            raise HomeAssistantError(f"Unknown delivery site {delivery_site_id}")
+        # One site after another, so only one chunk is held in memory at a time.
+        files = []
+        for site in sites:
+            path = Path(
+                hass.config.path(
+                    EXPORT_DIRECTORY, f"{site.delivery_site_id}_{start}_{end}.csv.gz"
+                )
+            )
+            rows = await _async_export(hass, site, start, end, path)
+            files.append(
+                {"delivery_site_id": site.delivery_site_id, "path": str(path), "rows": rows}
+            )
+        return {"files": files}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT,
+        _handle_export,
+        schema=vol.Schema(
+            {
+                vol.Required(ATTR_START_DATE): str,
+                vol.Required(ATTR_END_DATE): str,
+                vol.Optional(CONF_DELIVERY_SITE_ID): cv.string,
+            }
+        ),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
     domain_data[_SERVICE_FLAG] = True
 
 
+async def _async_export(
+    hass: HomeAssistant, site: OmaHelenCoordinator, start: date, end: date, path: Path
+) -> int:
+    writer = CsvExportWriter(path)
+    try:
+        await hass.async_add_executor_job(writer.open)
+        async with aclosing(site.async_iter_export(start, end)) as chunks:
+            async for columns in chunks:
+                await hass.async_add_executor_job(writer.write, columns)
+        await hass.async_add_executor_job(writer.close)
+    except BaseException:
+        await hass.async_add_executor_job(writer.abort)
+        raise
+    _LOGGER.debug("Exported %d rows to %s", writer.rows, path)
+    return writer.rows
+
+
+def _find_cheapest_window(hass: HomeAssistant, data: dict[str, Any]) -> ServiceResponse:
+    # Answered from the in-memory price index; no I/O.
+    prices = _price_index(hass, data.get(CONF_DELIVERY_SITE_ID))
+    interval = prices.interval_seconds
+    count = math.ceil(data[ATTR_DURATION].total_seconds() / interval)
+    profile: list[float] | None = data.get(ATTR_LOAD_PROFILE)
+    if profile is not None and len(profile) != count:
+        raise vol.Invalid(f"load_profile must have one value per quarter-hour ({count})")
+
+    now = dt_util.utcnow().timestamp()
+    earliest = data.get(ATTR_EARLIEST_START)
+    # The interval in progress is still usable from now on.
+    not_before = now - now % interval
+    if earliest is not None:
+        not_before = max(not_before, dt_util.as_utc(earliest).timestamp())
+    deadline = data.get(ATTR_DEADLINE)
+    not_after = None if deadline is None else dt_util.as_utc(deadline).timestamp()
+
+    if not data[ATTR_CONTIGUOUS]:
+        if profile is not None:
+            raise vol.Invalid("load_profile requires a contiguous window")
+        slots = prices.cheapest_slots(count, not_before, not_after)
+        if slots is None:
+            raise HomeAssistantError("Not enough known spot prices before the deadline")
+        return {
+            "slots": [
+                {
+                    "start": _isoformat(prices.starts[idx]),
+                    "end": _isoformat(prices.starts[idx] + interval),
+                    "price": prices.prices[idx] / 100.0,
+                }
+                for idx in slots
+            ],
+            "average_price": math.fsum(prices.prices[idx] for idx in slots) / count / 100.0,
+        }
+
+    if profile is not None:
+        best = prices.cheapest_profile_window(profile, not_before, not_after)
+        if best is None:
+            raise HomeAssistantError("No window with known spot prices fits before the deadline")
+        start, weighted = best
+        # kW per quarter-hour times c/kWh, into EUR.
+        response = {
+            "average_price": weighted / math.fsum(profile) / 100.0 if any(profile) else 0.0,
+            "estimated_cost": weighted * interval / 3600 / 100.0,
+        }
+    else:
+        best = prices.cheapest_window(count * interval, not_before, not_after)
+        if best is None:
+            raise HomeAssistantError("No window with known spot prices fits before the deadline")
+        start, mean = best
+        response = {"average_price": mean / 100.0}
+    return {
+        "start": _isoformat(start),
+        "end": _isoformat(start + count * interval),
+        **response,
+    }
+
+
+def _price_index(hass: HomeAssistant, delivery_site_id: str | None) -> SpotPriceIndex:
+    for account in hass.data[DOMAIN].get(DATA_ACCOUNTS, {}).values():
+        for site in account.sites:
+            if delivery_site_id in (None, site.delivery_site_id) and len(site.prices):
+                return site.prices
+    raise HomeAssistantError("No spot prices are available yet")
+
+
+def _isoformat(ts: float) -> str:
+    return dt_util.as_local(dt_util.utc_from_timestamp(ts)).isoformat()
+
+
 async def async_unload_services(hass: HomeAssistant) -> None:
     domain_data = hass.data.get(DOMAIN)
     if not domain_data or not domain_data.get(_SERVICE_FLAG):
@@ -59,5 +236,7 @@ async def async_unload_services(hass: HomeAssistant) -> None:
         return
 
     hass.services.async_remove(DOMAIN, SERVICE_REFRESH_STATISTICS)
+    hass.services.async_remove(DOMAIN, SERVICE_FIND_CHEAPEST_WINDOW)
+    hass.services.async_remove(DOMAIN, SERVICE_EXPORT)
     domain_data[_SERVICE_FLAG] = False
 
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+import logging
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .baseline import ConsumptionBaseline, ConsumptionCheck
+from .const import (
+    CONF_INITIAL_BACKFILL_DONE,
+    CONF_LAST_FETCHED_DATE,
+    CONF_LAST_IMPORTED_UNTIL,
+    CONF_LAST_SUM_COST,
+    CONF_LAST_SUM_KWH,
+    CONF_LAST_SUM_TOTAL_COST,
+    CONF_LAST_SUM_TRANSFER_COST,
+    CONF_PROVISIONAL_UNTIL,
+    DOMAIN,
+    STAT_CONSUMPTION,
+    STAT_COST,
+    STAT_TOTAL_COST,
+    STAT_TRANSFER_COST,
+    STATE_SAVE_DELAY,
+    STATE_STORAGE_VERSION,
+)
+from .timeutil import HELEN_TIME_ZONE, local_day_range
+
+_LOGGER = logging.getLogger(__name__)
+
+# Keys that older versions kept in ConfigEntry.data.
+_LEGACY_SUM_KEYS = {
+    STAT_CONSUMPTION: CONF_LAST_SUM_KWH,
+    STAT_COST: CONF_LAST_SUM_COST,
+    STAT_TRANSFER_COST: CONF_LAST_SUM_TRANSFER_COST,
+    STAT_TOTAL_COST: CONF_LAST_SUM_TOTAL_COST,
+}
+_LEGACY_KEYS = (
+    CONF_INITIAL_BACKFILL_DONE,
+    CONF_LAST_FETCHED_DATE,
+    CONF_LAST_IMPORTED_UNTIL,
+    CONF_PROVISIONAL_UNTIL,
+    *_LEGACY_SUM_KEYS.values(),
+)
+
+
+@dataclass(slots=True)
+class ImportState:
+    initial_backfill_done: bool = False
+    # End of the last settled interval that has been imported.
+    last_imported_until: datetime | None = None
+    # End of the provisional intervals imported after it, if any.
+    provisional_until: datetime | None = None
+    # Running sums per statistic kind at last_imported_until.
+    sums: dict[str, float] = field(default_factory=dict)
+    # What the sensors last showed, restored before the first poll after a restart.
+    last_interval_start: datetime | None = None
+    last_spot_price_eur_per_kwh: float | None = None
+    # Consumption profile learned from settled imports, saved with the checkpoint
+    # so every imported interval is counted exactly once.
+    baseline: ConsumptionBaseline = field(default_factory=ConsumptionBaseline)
+    consumption_check: ConsumptionCheck | None = None
+    # Set once the site has fed energy into the grid; from then on production
+    # and net consumption are imported as well.
+    has_production: bool = False
+
+    @property
+    def last_imported_day(self) -> date | None:
+        if self.last_imported_until is None:
+            return None
+        return (self.last_imported_until - timedelta(seconds=1)).astimezone(HELEN_TIME_ZONE).date()
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "initial_backfill_done": self.initial_backfill_done,
+            "last_imported_until": _format_optional(self.last_imported_until),
+            "provisional_until": _format_optional(self.provisional_until),
+            "sums": self.sums,
+            "last_interval_start": _format_optional(self.last_interval_start),
+            "last_spot_price_eur_per_kwh": self.last_spot_price_eur_per_kwh,
+            "baseline": self.baseline.as_dict(),
+            "consumption_check": (
+                None if self.consumption_check is None else self.consumption_check.as_dict()
+            ),
+            "has_production": self.has_production,
+        }
+
+
+class OmaHelenImportStateStore:
+    """Import progress of one config entry, saved with a debounce.
+
+    A checkpoint lost to a crash before the delayed save only means the last
+    windows are imported again from the previous checkpoint, which rewrites the
+    same rows with the same sums.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        self._hass = hass
+        self._entry = entry
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STATE_STORAGE_VERSION, f"{DOMAIN}.state.{entry.entry_id}"
+        )
+        self.state = ImportState()
+        self._loaded = False
+
+    async def async_load(self) -> None:
+        if self._loaded:
+            return
+        stored = await self._store.async_load()
+        if stored is not None:
+            self.state = ImportState(
+                initial_backfill_done=stored["initial_backfill_done"],
+                last_imported_until=_parse_optional(stored["last_imported_until"]),
+                provisional_until=_parse_optional(stored["provisional_until"]),
+                sums=dict(stored["sums"]),
+                last_interval_start=_parse_optional(stored.get("last_interval_start")),
+                last_spot_price_eur_per_kwh=stored.get("last_spot_price_eur_per_kwh"),
+                baseline=ConsumptionBaseline.from_dict(stored.get("baseline")),
+                consumption_check=ConsumptionCheck.from_dict(stored.get("consumption_check")),
+                has_production=stored.get("has_production", False),
+            )
+        else:
+            await self._async_migrate_entry_data()
+        self._loaded = True
+
+    def async_schedule_save(self) -> None:
+        self._store.async_delay_save(self._data_to_save, STATE_SAVE_DELAY)
+
+    async def async_flush(self) -> None:
+        if self._loaded:
+            await self._store.async_save(self._data_to_save())
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
+
+    async def _async_migrate_entry_data(self) -> None:
+        data = self._entry.data
+        last_imported_until = _parse_optional(data.get(CONF_LAST_IMPORTED_UNTIL))
+        if last_imported_until is None and data.get(CONF_LAST_FETCHED_DATE):
+            day = date.fromisoformat(data[CONF_LAST_FETCHED_DATE])
+            last_imported_until = dt_util.as_utc(local_day_range(day, day)[1])
+        self.state = ImportState(
+            initial_backfill_done=bool(data.get(CONF_INITIAL_BACKFILL_DONE, False)),
+            last_imported_until=last_imported_until,
+            provisional_until=_parse_optional(data.get(CONF_PROVISIONAL_UNTIL)),
+            sums={
+                kind: float(data[key]) for kind, key in _LEGACY_SUM_KEYS.items() if key in data
+            },
+        )
+        # Write the state before dropping the old keys, so a failure in between
+        # leaves the entry data to migrate from again.
+        await self._store.async_save(self._data_to_save())
+
+        if any(key in data for key in _LEGACY_KEYS):
+            _LOGGER.debug("Moved import progress of %s out of the config entry", self._entry.title)
+            self._hass.config_entries.async_update_entry(
+                self._entry,
+                data={key: value for key, value in data.items() if key not in _LEGACY_KEYS},
+            )
+
+    def _data_to_save(self) -> dict[str, Any]:
+        return self.state.as_dict()
+
+
+def _parse_optional(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _format_optional(value: datetime | None) -> str | None:
+    return value.isoformat() if value is not None else None
@@ -1,131 +1,408 @@
 from __future__ import annotations
 
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import accumulate, compress, islice
 import logging
+import math
+from operator import le, sub
 
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
 
-from .const import STATS_SOURCE
+from .const import (
+    AGGREGATION_HOUR,
+    STAT_CONSUMPTION,
+    STAT_COST,
+    STAT_EXPECTED_CONSUMPTION,
+    STAT_FEED_IN_REVENUE,
+    STAT_NET_CONSUMPTION,
+    STAT_PRODUCTION,
+    STAT_TOTAL_COST,
+    STAT_TRANSFER_COST,
+    STATS_SOURCE,
+)
+from .timeutil import local_day_start
 
 _LOGGER = logging.getLogger(__name__)
 
+_SUM_TOLERANCE = 1e-6
+_ANCHOR_LOOKBACK = timedelta(days=7)
+_HISTORY_START = datetime(2000, 1, 1, tzinfo=dt_util.UTC)
+# Optional columns that are summed per bucket when rows are aggregated.
+_SUMMED_COLUMNS = (
+    "energy_cost_eur",
+    "transfer_cost_eur",
+    "expected_consumption_kwh",
+    "production_kwh",
+    "feed_in_revenue_eur",
+)
+# Columns computed from the spot price. A bucket with an unpriced interval gets no
+# value rather than the sum of its priced part, and is written once prices arrive.
+_PRICED_COLUMNS = frozenset({"energy_cost_eur", "feed_in_revenue_eur"})
+STATISTIC_KINDS = (
+    STAT_CONSUMPTION,
+    STAT_COST,
+    STAT_TRANSFER_COST,
+    STAT_TOTAL_COST,
+    STAT_EXPECTED_CONSUMPTION,
+    STAT_PRODUCTION,
+    STAT_NET_CONSUMPTION,
+    STAT_FEED_IN_REVENUE,
+)
+_ENERGY_KINDS = frozenset(
+    {STAT_CONSUMPTION, STAT_EXPECTED_CONSUMPTION, STAT_PRODUCTION, STAT_NET_CONSUMPTION}
+)
+_STATISTIC_NAMES = {
+    STAT_CONSUMPTION: "Oma Helen consumption",
+    STAT_COST: "Oma Helen cost",
+    STAT_TRANSFER_COST: "Oma Helen transfer cost",
+    STAT_TOTAL_COST: "Oma Helen total cost",
+    STAT_EXPECTED_CONSUMPTION: "Oma Helen expected consumption",
+    STAT_PRODUCTION: "Oma Helen production",
+    STAT_NET_CONSUMPTION: "Oma Helen net consumption",
+    STAT_FEED_IN_REVENUE: "Oma Helen feed-in revenue",
+}
+
+
+class PointColumns:
+    # Parallel float columns, one row per interval. Starts are UTC epoch seconds
+    # and a missing spot price is stored as NaN. Consumption and production are
+    # both positive; production is only set where the source has it. The cost
+    # columns are filled in by the tariff engine and the expected consumption by
+    # the baseline; all of them are summed, not recomputed, when rows are
+    # aggregated. Where the source sends some spot prices without VAT, they are
+    # flagged with 1.0 in spot_excludes_vat until the tariff engine adds VAT.
+    __slots__ = (
+        "starts",
+        "consumption_kwh",
+        "spot_price_c_per_kwh",
+        "energy_cost_eur",
+        "transfer_cost_eur",
+        "expected_consumption_kwh",
+        "production_kwh",
+        "feed_in_revenue_eur",
+        "spot_excludes_vat",
+    )
+
+    def __init__(self) -> None:
+        self.starts = array("d")
+        self.consumption_kwh = array("d")
+        self.spot_price_c_per_kwh = array("d")
+        self.energy_cost_eur: array | None = None
+        self.transfer_cost_eur: array | None = None
+        self.expected_consumption_kwh: array | None = None
+        self.production_kwh: array | None = None
+        self.feed_in_revenue_eur: array | None = None
+        self.spot_excludes_vat: array | None = None
+
+    def append(self, start: float, consumption_kwh: float, spot_price_c_per_kwh: float | None) -> None:
+        self.starts.append(start)
+        self.consumption_kwh.append(consumption_kwh)
+        self.spot_price_c_per_kwh.append(math.nan if spot_price_c_per_kwh is None else spot_price_c_per_kwh)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def is_sorted(self) -> bool:
+        return all(map(le, self.starts, islice(self.starts, 1, None)))
+
+    def sort(self) -> None:
+        order = sorted(range(len(self.starts)), key=self.starts.__getitem__)
+        for name in self.__slots__:
+            column = getattr(self, name)
+            if column is not None:
+                setattr(self, name, array("d", map(column.__getitem__, order)))
+
+
+def aggregate_points(columns: PointColumns, aggregation: str) -> PointColumns:
+    if not columns.is_sorted():
+        columns.sort()
+
+    bucket_start = _hour_start if aggregation == AGGREGATION_HOUR else local_day_start
+    summed_names = [name for name in _SUMMED_COLUMNS if getattr(columns, name) is not None]
+    aggregated = PointColumns()
+    for name in summed_names:
+        setattr(aggregated, name, array("d"))
+
+    bucket_of = array("d", map(bucket_start, columns.starts))
+    row = 0
+    total = len(columns)
+    while row < total:
+        bucket = bucket_of[row]
+        end = row + 1
+        while end < total and bucket_of[end] == bucket:
+            end += 1
+
+        prices = [p for p in columns.spot_price_c_per_kwh[row:end] if not math.isnan(p)]
+        aggregated.append(
+            bucket,
+            math.fsum(columns.consumption_kwh[row:end]),
+            math.fsum(prices) / len(prices) if prices else None,
+        )
+        for name in summed_names:
+            values = getattr(columns, name)[row:end]
+            if name in _PRICED_COLUMNS:
+                getattr(aggregated, name).append(math.fsum(values))
+                continue
+            values = [v for v in values if not math.isnan(v)]
+            getattr(aggregated, name).append(math.fsum(values) if values else math.nan)
+        row = end
+    return aggregated
 
-@dataclass(frozen=True, slots=True)
-class ConsumptionAndCostPoint:
-    start: datetime
-    consumption_kwh: float
-    spot_price_c_per_kwh: float | None
+
+def _hour_start(ts: float) -> float:
+    return ts - ts % 3600
 
 
 @dataclass(frozen=True, slots=True)
 class _LastValues:
     last_interval_start: datetime | None
     last_spot_price_eur_per_kwh: float | None
-    last_sum_kwh: float
-    last_sum_cost: float
-
+    sums: dict[str, float]
 
-def build_consumption_statistic_id(delivery_site_id: str) -> str:
-    return f"{STATS_SOURCE}:{delivery_site_id}:consumption"
 
+def build_statistic_id(delivery_site_id: str, kind: str) -> str:
+    return f"{STATS_SOURCE}:{delivery_site_id}:{kind}"
 
-def build_cost_statistic_id(delivery_site_id: str) -> str:
-    return f"{STATS_SOURCE}:{delivery_site_id}:cost"
 
-
-def _spot_to_eur_per_kwh(spot_price_c_per_kwh: float | None) -> float | None:
-    if spot_price_c_per_kwh is None:
-        return None
-    return spot_price_c_per_kwh / 100.0
+def statistic_kinds(
+    *,
+    include_cost: bool,
+    include_transfer: bool,
+    include_expected: bool = False,
+    include_production: bool = False,
+) -> list[str]:
+    kinds = [STAT_CONSUMPTION]
+    if include_cost:
+        kinds.append(STAT_COST)
+        if include_transfer:
+            kinds.extend((STAT_TRANSFER_COST, STAT_TOTAL_COST))
+    if include_expected:
+        kinds.append(STAT_EXPECTED_CONSUMPTION)
+    if include_production:
+        kinds.extend((STAT_PRODUCTION, STAT_NET_CONSUMPTION))
+        if include_cost:
+            kinds.append(STAT_FEED_IN_REVENUE)
+    return kinds
 
 
 def build_statistics(
     hass: HomeAssistant,
-    consumption_statistic_id: str,
-    cost_statistic_id: str | None,
-    points: list[ConsumptionAndCostPoint],
+    delivery_site_id: str,
+    columns: PointColumns,
     *,
-    last_sum_kwh: float,
-    last_sum_cost: float,
-    include_cost: bool,
+    kinds: list[str],
+    last_sums: dict[str, float],
 ):
     from homeassistant.components.recorder.statistics import StatisticData, StatisticMetaData
 
-    consumption_meta = StatisticMetaData(
-        has_mean=False,
-        has_sum=True,
-        name="Oma Helen consumption",
-        source=STATS_SOURCE,
-        statistic_id=consumption_statistic_id,
-        unit_of_measurement="kWh",
-    )
+    if not columns.is_sorted():
+        # Helen returns the series in time order; only pay for a sort when it did not.
+        _LOGGER.debug("Measurement series for %s was out of order", delivery_site_id)
+        columns.sort()
+
+    starts = list(map(dt_util.utc_from_timestamp, columns.starts))
+    currency = hass.config.currency or "EUR"
 
-    cost_meta = None
-    if include_cost and cost_statistic_id:
-        cost_meta = StatisticMetaData(
+    statistics = {}
+    sums: dict[str, float] = {}
+    for kind in kinds:
+        values = _series_values(columns, kind)
+        if values is None:
+            continue
+        meta = StatisticMetaData(
             has_mean=False,
             has_sum=True,
-            name="Oma Helen cost",
+            name=_STATISTIC_NAMES[kind],
             source=STATS_SOURCE,
-            statistic_id=cost_statistic_id,
-            unit_of_measurement=hass.config.currency or "EUR",
+            statistic_id=build_statistic_id(delivery_site_id, kind),
+            unit_of_measurement="kWh" if kind in _ENERGY_KINDS else currency,
         )
+        rows, sums[kind] = _build_rows(StatisticData, starts, values, last_sums.get(kind, 0.0))
+        statistics[kind] = (meta, rows)
 
-    consumption_data: list[StatisticData] = []
-    cost_data: list[StatisticData] | None = [] if cost_meta else None
-
-    sum_kwh = last_sum_kwh
-    sum_cost = last_sum_cost
     last_price_eur_per_kwh = None
-    last_interval_start = None
-
-    for point in points:
-        sum_kwh += point.consumption_kwh
-        consumption_data.append(StatisticData(start=point.start, state=point.consumption_kwh, sum=sum_kwh))
-
-        spot_eur_per_kwh = _spot_to_eur_per_kwh(point.spot_price_c_per_kwh)
-        if spot_eur_per_kwh is not None:
-            last_price_eur_per_kwh = spot_eur_per_kwh
-
-        if cost_data is not None and spot_eur_per_kwh is not None:
-            sum_cost += point.consumption_kwh * spot_eur_per_kwh
-            cost_data.append(
-                StatisticData(
-                    start=point.start,
-                    state=point.consumption_kwh * spot_eur_per_kwh,
-                    sum=sum_cost,
-                )
-            )
-
-        last_interval_start = point.start
+    for spot in reversed(columns.spot_price_c_per_kwh):
+        if not math.isnan(spot):
+            last_price_eur_per_kwh = spot / 100.0
+            break
 
     return (
-        (consumption_meta, consumption_data),
-        (cost_meta, cost_data) if cost_meta and cost_data is not None else None,
+        statistics,
         _LastValues(
-            last_interval_start=last_interval_start,
+            last_interval_start=starts[-1] if starts else None,
             last_spot_price_eur_per_kwh=last_price_eur_per_kwh,
-            last_sum_kwh=sum_kwh,
-            last_sum_cost=sum_cost,
+            sums=sums,
         ),
     )
 
 
+def _series_values(columns: PointColumns, kind: str) -> array | None:
+    if kind == STAT_CONSUMPTION:
+        return columns.consumption_kwh
+    if kind == STAT_COST:
+        return columns.energy_cost_eur
+    if kind == STAT_TRANSFER_COST:
+        return columns.transfer_cost_eur
+    if kind == STAT_TOTAL_COST:
+        if columns.energy_cost_eur is None or columns.transfer_cost_eur is None:
+            return None
+        # Transfer is owed whether or not the interval has a spot price.
+        return array("d", map(_add_known, columns.transfer_cost_eur, columns.energy_cost_eur))
+    if kind == STAT_EXPECTED_CONSUMPTION:
+        return columns.expected_consumption_kwh
+    if kind == STAT_PRODUCTION:
+        return columns.production_kwh
+    if kind == STAT_NET_CONSUMPTION:
+        if columns.production_kwh is None:
+            return None
+        return array("d", map(sub, columns.consumption_kwh, columns.production_kwh))
+    if kind == STAT_FEED_IN_REVENUE:
+        return columns.feed_in_revenue_eur
+    return None
+
+
+def _add_known(transfer: float, energy: float) -> float:
+    return transfer if math.isnan(energy) else transfer + energy
+
+
+def _build_rows(statistic_data, starts: list[datetime], values: array, last_sum: float):
+    # Intervals without a value (e.g. no spot price) get no row at all.
+    present = [not math.isnan(value) for value in values]
+    states = array("d", compress(values, present))
+    sums = array("d", islice(accumulate(states, initial=last_sum), 1, None))
+    rows = [
+        statistic_data(start=start, state=state, sum=total)
+        for start, state, total in zip(compress(starts, present), states, sums)
+    ]
+    return rows, sums[-1] if sums else last_sum
+
+
 async def insert_statistics(
     hass: HomeAssistant,
-    consumption_stats,
-    cost_stats,
+    statistics,
     *,
     force_overwrite: bool,
-) -> None:
+    end: datetime | None = None,
+) -> dict[str, float]:
+    if force_overwrite:
+        if end is None:
+            raise HomeAssistantError("Overwriting statistics requires the end of the range")
+        return {
+            kind: await _async_reconcile_statistics(hass, stats, end)
+            for kind, stats in statistics.items()
+        }
+
     from homeassistant.components.recorder.statistics import async_add_external_statistics
 
-    consumption_meta, consumption_data = consumption_stats
-    await async_add_external_statistics(hass, consumption_meta, consumption_data)
+    for meta, rows in statistics.values():
+        if rows:
+            async_add_external_statistics(hass, meta, rows)
+    return {kind: 0.0 for kind in statistics}
+
+
+async def async_get_last_sum_before(
+    hass: HomeAssistant, statistic_id: str, before: datetime
+) -> float | None:
+    from homeassistant.components.recorder import get_instance
+    from homeassistant.components.recorder.statistics import statistics_during_period
+
+    instance = get_instance(hass)
+    await instance.async_block_till_done()
+    # Look at the last week of hourly rows first; only fall back to scanning the
+    # whole history (reduced per month) when there is a longer gap.
+    for start_time, period in ((before - _ANCHOR_LOOKBACK, "hour"), (_HISTORY_START, "month")):
+        result = await instance.async_add_executor_job(
+            statistics_during_period, hass, start_time, before, {statistic_id}, period, None, {"sum"}
+        )
+        rows = result.get(statistic_id)
+        if rows:
+            return rows[-1]["sum"]
+    return None
+
+
+async def _async_reconcile_statistics(hass: HomeAssistant, stats, end: datetime) -> float:
+    from homeassistant.components.recorder import get_instance
+    from homeassistant.components.recorder.statistics import (
+        async_add_external_statistics,
+        statistics_during_period,
+    )
+
+    meta, rows = stats
+    if not rows:
+        return 0.0
+    statistic_id = meta["statistic_id"]
+
+    instance = get_instance(hass)
+    await instance.async_block_till_done()
+    result = await instance.async_add_executor_job(
+        statistics_during_period,
+        hass,
+        rows[0]["start"],
+        end,
+        {statistic_id},
+        "hour",
+        None,
+        {"state", "sum"},
+    )
+    stored_rows = result.get(statistic_id, [])
+    stored = {row["start"]: (row["state"], row["sum"]) for row in stored_rows}
+    rows = _with_stale_rows_emptied(rows, stored_rows, end.timestamp())
+
+    changed = [
+        row
+        for row in rows
+        if not _same_row(stored.get(row["start"].timestamp()), row["state"], row["sum"])
+    ]
+    if changed:
+        async_add_external_statistics(hass, meta, changed)
+
+    old_end_sum = stored_rows[-1]["sum"] if stored_rows else rows[0]["sum"] - rows[0]["state"]
+    delta = rows[-1]["sum"] - old_end_sum
+    if abs(delta) > _SUM_TOLERANCE:
+        # Rows after the range keep their own states; only their running sums move.
+        instance.async_adjust_statistics(statistic_id, end, delta, meta["unit_of_measurement"])
+
+    _LOGGER.debug(
+        "Reconciled %s: %d of %d rows changed, later sums shifted by %s",
+        statistic_id,
+        len(changed),
+        len(rows),
+        delta,
+    )
+    return delta
+
+
+def _with_stale_rows_emptied(rows, stored_rows, end_ts: float):
+    # Stored rows in the range that the new rows do not cover, such as the hourly
+    # rows of a day now written as one daily row, are emptied: state 0 and the
+    # running sum of the new row before them, so nothing is counted twice and the
+    # sums stay continuous. The recorder has no call to delete single rows.
+    starts = [row["start"].timestamp() for row in rows]
+    covered = set(starts)
+    stale = [
+        row["start"]
+        for row in stored_rows
+        if row["start"] not in covered and row["start"] < end_ts
+    ]
+    if not stale:
+        return rows
+    emptied = [
+        {
+            "start": dt_util.utc_from_timestamp(start),
+            "state": 0.0,
+            "sum": rows[bisect_right(starts, start) - 1]["sum"],
+        }
+        for start in stale
+    ]
+    return sorted([*rows, *emptied], key=lambda row: row["start"])
+
 
-    if cost_stats:
-        cost_meta, cost_data = cost_stats
-        if cost_meta is not None:
-            await async_add_external_statistics(hass, cost_meta, cost_data)
+def _same_row(stored: tuple[float | None, float | None] | None, state: float, total: float) -> bool:
+    if stored is None or stored[0] is None or stored[1] is None:
+        return False
+    return abs(stored[0] - state) <= _SUM_TOLERANCE and abs(stored[1] - total) <= _SUM_TOLERANCE
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+# Helen reports and settles in Finnish local time; days and months start at
+# Helsinki midnight, so they are 23 or 25 hours long around DST changes.
+HELEN_TIME_ZONE = ZoneInfo("Europe/Helsinki")
+
+
+def local_midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=HELEN_TIME_ZONE)
+
+
+def local_day_range(start: date, end: date) -> tuple[datetime, datetime]:
+    # Half-open range covering the local days start..end, both included.
+    return local_midnight(start), local_midnight(end + timedelta(days=1))
+
+
+def local_day_bounds(day: date) -> tuple[float, float]:
+    day_start, day_end = local_day_range(day, day)
+    return day_start.timestamp(), day_end.timestamp()
+
+
+def local_day(ts: float) -> date:
+    return datetime.fromtimestamp(ts, HELEN_TIME_ZONE).date()
+
+
+def local_day_start(ts: float) -> float:
+    return local_midnight(local_day(ts)).timestamp()
+
+
+def local_month_bounds(ts: float) -> tuple[float, float]:
+    local = local_day(ts)
+    first = date(local.year, local.month, 1)
+    following = date(local.year + 1, 1, 1) if local.month == 12 else date(local.year, local.month + 1, 1)
+    return local_midnight(first).timestamp(), local_midnight(following).timestamp()
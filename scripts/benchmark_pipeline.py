@@ -0,0 +1,253 @@
+"""Benchmark the Oma Helen import pipeline on synthetic Helen responses.
+
+Every stage between the raw chart-data body and the recorder write is timed
+(best of several runs) and its peak traced memory is recorded, for one day, one
+month and two years of quarter-hour data. The recorder is replaced by an
+in-memory SQLite table with the same upsert semantics as external statistics.
+
+    python scripts/benchmark_pipeline.py --save      # record a baseline
+    python scripts/benchmark_pipeline.py             # compare against it
+
+Comparing exits with status 1 when a stage got slower or uses more memory than
+the baseline allows. Baselines are machine specific; record one on the same
+machine before measuring a change.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import Callable
+from datetime import date, datetime, time, timedelta, timezone
+import json
+import math
+from pathlib import Path
+import random
+import sqlite3
+import sys
+import time as time_module
+import tracemalloc
+import types
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "custom_components"))
+
+DEFAULT_BASELINE = Path(__file__).with_name("benchmark_baseline.json")
+SIZES = {"1 day": 1, "1 month": 31, "2 years": 730}
+FIRST_DAY = date(2024, 1, 1)
+
+# Allowed growth over the baseline before a stage counts as a regression, and
+# the absolute noise floor below which differences are ignored.
+TIME_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.2
+TIME_FLOOR_SECONDS = 0.002
+MEMORY_FLOOR_BYTES = 64 * 1024
+
+
+class SQLiteRecorder:
+    """Stand-in for the recorder's external statistics table."""
+
+    def __init__(self) -> None:
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute(
+            "CREATE TABLE statistics ("
+            " statistic_id TEXT NOT NULL, start REAL NOT NULL, state REAL, sum REAL,"
+            " PRIMARY KEY (statistic_id, start))"
+        )
+
+    def async_add_external_statistics(
+        self, hass: Any, metadata: dict[str, Any], statistics: list[dict[str, Any]]
+    ) -> None:
+        statistic_id = metadata["statistic_id"]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO statistics VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (statistic_id, start) DO UPDATE"
+                " SET state = excluded.state, sum = excluded.sum",
+                (
+                    (statistic_id, row["start"].timestamp(), row["state"], row["sum"])
+                    for row in statistics
+                ),
+            )
+
+    def row_count(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM statistics").fetchone()[0]
+
+
+def install_recorder(recorder: SQLiteRecorder) -> None:
+    # statistics.py imports these lazily, so a module registered here is used
+    # instead of the real recorder (which needs a database and a running hass).
+    module = types.ModuleType("homeassistant.components.recorder.statistics")
+    module.StatisticData = dict
+    module.StatisticMetaData = dict
+    module.async_add_external_statistics = recorder.async_add_external_statistics
+    sys.modules[module.__name__] = module
+
+
+def build_response(days: int, seed: int = 1) -> str:
+    """Return a chart-data body shaped like Helen's for the given number of days."""
+    from oma_helen.timeutil import HELEN_TIME_ZONE
+
+    rng = random.Random(seed)
+    start = datetime.combine(FIRST_DAY, time.min, tzinfo=HELEN_TIME_ZONE).astimezone(timezone.utc)
+    stop = datetime.combine(
+        FIRST_DAY + timedelta(days=days), time.min, tzinfo=HELEN_TIME_ZONE
+    ).astimezone(timezone.utc)
+    series = []
+    interval = start
+    while interval < stop:
+        hour = interval.astimezone(HELEN_TIME_ZONE).hour
+        following = interval + timedelta(minutes=15)
+        series.append(
+            {
+                "start": interval.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "stop": following.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "electricity": round(0.05 + 0.4 * rng.random() * (1.5 if 7 <= hour < 22 else 1.0), 3),
+                "electricity_spot_prices_vat": round(rng.gauss(8.0, 4.0), 3),
+                "electricity_spot_prices": None,
+            }
+        )
+        interval = following
+    return json.dumps(
+        {
+            "start": start.isoformat(),
+            "stop": stop.isoformat(),
+            "resolution": "quarter",
+            "series": series,
+        }
+    )
+
+
+def run_pipeline(hass: Any, body: str, days: int, measure: Callable[[str, Callable[[], Any]], Any]) -> int:
+    from oma_helen import api
+    from oma_helen.cache import OmaHelenResponseCache
+    from oma_helen.const import AGGREGATION_HOUR, RESOLUTION_QUARTER
+    from oma_helen.cost import Tariff, apply_tariff
+    from oma_helen.statistics import aggregate_points, build_statistics, insert_statistics, statistic_kinds
+
+    end = FIRST_DAY + timedelta(days=days - 1)
+    cache = OmaHelenResponseCache(hass, "benchmark", RESOLUTION_QUARTER)
+    tariff = Tariff(
+        vat_rate=25.5,
+        energy_margin_c_per_kwh=0.5,
+        transfer_fee_c_per_kwh=3.5,
+        transfer_base_eur_per_month=5.0,
+    )
+    kinds = statistic_kinds(include_cost=True, include_transfer=True)
+
+    measure("parse", lambda: cache.ingest(FIRST_DAY, end, api.iter_series(body)))
+    columns = measure("columns", lambda: cache.columns(FIRST_DAY, end))
+    measure("tariff", lambda: apply_tariff(columns, tariff, 900))
+    columns = measure("aggregate", lambda: aggregate_points(columns, AGGREGATION_HOUR))
+    statistics, _ = measure(
+        "build_statistics",
+        lambda: build_statistics(hass, "benchmark", columns, kinds=kinds, last_sums={}),
+    )
+    measure(
+        "insert_statistics",
+        lambda: asyncio.run(insert_statistics(hass, statistics, force_overwrite=False)),
+    )
+    return len(columns)
+
+
+def benchmark(repeats: int) -> dict[str, dict[str, dict[str, float]]]:
+    recorder = SQLiteRecorder()
+    install_recorder(recorder)
+    hass = types.SimpleNamespace(config=types.SimpleNamespace(currency="EUR"))
+
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    for label, days in SIZES.items():
+        body = build_response(days)
+        timings: dict[str, float] = {}
+
+        def timed(stage: str, func: Callable[[], Any]) -> Any:
+            started = time_module.perf_counter()
+            value = func()
+            elapsed = time_module.perf_counter() - started
+            timings[stage] = min(timings.get(stage, math.inf), elapsed)
+            return value
+
+        for _ in range(repeats):
+            rows = run_pipeline(hass, body, days, timed)
+
+        peaks: dict[str, float] = {}
+
+        def traced(stage: str, func: Callable[[], Any]) -> Any:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            value = func()
+            peaks[stage] = tracemalloc.get_traced_memory()[1] - before
+            return value
+
+        tracemalloc.start()
+        try:
+            run_pipeline(hass, body, days, traced)
+        finally:
+            tracemalloc.stop()
+
+        results[label] = {
+            stage: {"seconds": timings[stage], "peak_bytes": peaks[stage]} for stage in timings
+        }
+        print(f"{label}: {len(body) / 1e6:.1f} MB body, {rows} hourly rows")
+        for stage, result in results[label].items():
+            print(
+                f"  {stage:<18} {result['seconds'] * 1000:10.2f} ms"
+                f" {result['peak_bytes'] / 1024:12.0f} KiB"
+            )
+    print(f"recorder stand-in holds {recorder.row_count()} rows")
+    return results
+
+
+def find_regressions(
+    results: dict[str, dict[str, dict[str, float]]],
+    baseline: dict[str, dict[str, dict[str, float]]],
+) -> list[str]:
+    regressions = []
+    for label, stages in results.items():
+        for stage, result in stages.items():
+            base = baseline.get(label, {}).get(stage)
+            if base is None:
+                continue
+            seconds, base_seconds = result["seconds"], base["seconds"]
+            if (
+                seconds > base_seconds * (1 + TIME_TOLERANCE)
+                and seconds - base_seconds > TIME_FLOOR_SECONDS
+            ):
+                regressions.append(
+                    f"{label} / {stage}: {seconds * 1000:.2f} ms,"
+                    f" baseline {base_seconds * 1000:.2f} ms"
+                )
+            peak, base_peak = result["peak_bytes"], base["peak_bytes"]
+            if peak > base_peak * (1 + MEMORY_TOLERANCE) and peak - base_peak > MEMORY_FLOOR_BYTES:
+                regressions.append(
+                    f"{label} / {stage}: {peak / 1024:.0f} KiB peak,"
+                    f" baseline {base_peak / 1024:.0f} KiB"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    results = benchmark(args.repeats)
+    if args.save:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --save first")
+        return 0
+
+    regressions = find_regressions(results, json.loads(args.baseline.read_text(encoding="utf-8")))
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())